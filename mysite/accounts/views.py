@@ -3,8 +3,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from .forms import ProfileUpdateForm
 from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count
 from articles.models import Article  # adjust if model name different
-from dashboard.models import HealthLog  # adjust if different
+from dashboard.models import HealthLog, health_score_expression  # adjust if different
 
 @login_required(login_url="/login/")
 def profile_view(request):
@@ -12,17 +13,20 @@ def profile_view(request):
     user = request.user
 
     # Health Logs
-    logs = HealthLog.objects.filter(user=user)
-    total_logs = logs.count()
-
-    if total_logs > 0:
-        avg_score = round(sum(log.health_score for log in logs) / total_logs, 2)
-    else:
-        avg_score = None
+    log_stats = HealthLog.objects.filter(user=user).aggregate(
+        total=Count("id"),
+        avg=Avg(health_score_expression()),
+    )
+    total_logs = log_stats["total"]
+    avg_score = round(log_stats["avg"], 2) if log_stats["avg"] is not None else None
 
     # Articles
-    articles = Article.objects.filter(author=user)
-    article_count = articles.count()
+    articles = list(
+        Article.objects.filter(author=user)
+        .only("id", "title", "status", "created_at")
+        .order_by("-created_at")
+    )
+    article_count = len(articles)
 
     context = {
         "total_logs": total_logs,
@@ -6,6 +6,7 @@ STATUS_CHOICES = [
     ('approved', 'Approved'),
     ('rejected', 'Rejected'),
 ]
+CATEGORIES_CACHE_KEY = "article_categories"
 
 
 # Create your models here.
@@ -23,4 +24,10 @@ class Article(models.Model):
     reviewed_at = models.DateTimeField(null=True, blank=True)
     rejection_reason = models.TextField(blank=True)
 
-    is_published = models.BooleanField(default=False)
\ No newline at end of file
+    is_published = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-created_at"]),
+            models.Index(fields=["author", "-created_at"]),
+        ]
\ No newline at end of file
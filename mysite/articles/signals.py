@@ -0,0 +1,10 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import CATEGORIES_CACHE_KEY, Article
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_article_categories(sender, instance, **kwargs):
+    cache.delete(CATEGORIES_CACHE_KEY)
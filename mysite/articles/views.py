@@ -1,19 +1,31 @@
 from unicodedata import category
 from django.db.models import Q
+from django.db.models.functions import Substr
 from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from html import escape
+import hashlib
+import io
 import logging
 import re
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import Group
 from django.core.exceptions import PermissionDenied
-from .models import Article
+from django.http import Http404
+from .models import CATEGORIES_CACHE_KEY, Article
 from .forms import ArticleForm
 
 logger = logging.getLogger(__name__)
 
+BLOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+_EM_RE = re.compile(r"\*(.+?)\*")
+_OL_RE = re.compile(r"^\d+\.\s+")
+
 
 def article(request):
     category = request.GET.get("category")
@@ -22,32 +34,54 @@ def article(request):
     if category and category != "All":
         approved_articles = approved_articles.filter(category__iexact=category)
     if search_query:
-            approved_articles = approved_articles.filter(
-        Q(title__icontains=search_query) |
-        Q(content__icontains=search_query)
-)
-    approved_articles = approved_articles.order_by("-created_at")
-    is_doctor = False
-    if request.user.is_authenticated:
-        is_doctor = request.user.groups.filter(name="Doctor").exists()
+        approved_articles = approved_articles.filter(
+            Q(title__icontains=search_query) |
+            Q(content__icontains=search_query)
+        )
+    approved_articles = (
+        approved_articles.select_related("author")
+        .only("id", "title", "created_at", "category", "status", "author__username")
+        .annotate(excerpt=Substr("content", 1, 400))
+        .order_by("-created_at")
+    )
+    page_obj = Paginator(approved_articles, 20).get_page(request.GET.get("page"))
+    is_doctor = request.user.is_authenticated and "Doctor" in user_groups(request.user)
 
     return render(request, 'articles/articles.html', {
-        "approved_articles": approved_articles,
+        "approved_articles": page_obj,
+        "page_obj": page_obj,
         "is_doctor": is_doctor,
         "selected_category": category or "All",
         "search_query": search_query or "",
-        "categories": Article.objects.values_list("category", flat=True).distinct(),
+        "categories": _article_categories(),
     })
 
 
+def _article_categories():
+    return cache.get_or_set(
+        CATEGORIES_CACHE_KEY,
+        lambda: list(
+            Article.objects.order_by("category").values_list("category", flat=True).distinct()
+        ),
+        300,
+    )
+
+
+def user_groups(user):
+    # Cache the group names on the user object so every check in a request shares one query.
+    if not hasattr(user, "_cached_groups"):
+        user._cached_groups = set(user.groups.values_list("name", flat=True))
+    return user._cached_groups
+
+
 def is_doctor(user):
-    if user.groups.filter(name="Doctor").exists():
+    if "Doctor" in user_groups(user):
         return True
     raise PermissionDenied
 
 
 def is_admin(user):
-    return user.groups.filter(name="Admin").exists()
+    return "Admin" in user_groups(user)
 
 
 try:
@@ -55,27 +89,40 @@ try:
 except ModuleNotFoundError:
     genai = None
 
+_GENAI_MODEL = None
+
+
+def _get_model():
+    # Configure the SDK and build the model once per process so its
+    # transport is reused across blog generations.
+    global _GENAI_MODEL
+    if _GENAI_MODEL is None:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _GENAI_MODEL = genai.GenerativeModel("models/gemini-2.5-flash")
+    return _GENAI_MODEL
+
 
 def _inline_markdown_to_html(text: str) -> str:
     safe = escape(text)
-    safe = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", safe)
-    safe = re.sub(r"\*(.+?)\*", r"<em>\1</em>", safe)
+    safe = _BOLD_RE.sub(r"<strong>\1</strong>", safe)
+    safe = _EM_RE.sub(r"<em>\1</em>", safe)
     return safe
 
 
 def _format_generated_article(raw_text: str) -> str:
     lines = (raw_text or "").splitlines()
-    html_parts = []
+    buf = io.StringIO()
+    write = buf.write
     in_ul = False
     in_ol = False
 
     def close_lists():
         nonlocal in_ul, in_ol
         if in_ul:
-            html_parts.append("</ul>")
+            write("</ul>\n")
             in_ul = False
         if in_ol:
-            html_parts.append("</ol>")
+            write("</ol>\n")
             in_ol = False
 
     for raw_line in lines:
@@ -84,46 +131,59 @@ def _format_generated_article(raw_text: str) -> str:
             close_lists()
             continue
 
-        if line.startswith("### "):
-            close_lists()
-            html_parts.append(f"<h3>{_inline_markdown_to_html(line[4:])}</h3>")
-            continue
-        if line.startswith("## "):
-            close_lists()
-            html_parts.append(f"<h2>{_inline_markdown_to_html(line[3:])}</h2>")
-            continue
-        if line.startswith("# "):
-            close_lists()
-            html_parts.append(f"<h1>{_inline_markdown_to_html(line[2:])}</h1>")
-            continue
-
-        if re.match(r"^(\*|-|•)\s+", line):
+        # Dispatch on the first character so the regex only runs on digit lines.
+        first = line[0]
+
+        if first == "#":
+            head = line[:4]
+            if head == "### ":
+                tag, body = "h3", line[4:]
+            elif head[:3] == "## ":
+                tag, body = "h2", line[3:]
+            elif head[:2] == "# ":
+                tag, body = "h1", line[2:]
+            else:
+                tag = None
+            if tag:
+                close_lists()
+                write(f"<{tag}>")
+                write(_inline_markdown_to_html(body))
+                write(f"</{tag}>\n")
+                continue
+
+        if first in "*-•" and line[1:2].isspace():
             if in_ol:
-                html_parts.append("</ol>")
+                write("</ol>\n")
                 in_ol = False
             if not in_ul:
-                html_parts.append("<ul>")
+                write("<ul>\n")
                 in_ul = True
-            item = re.sub(r"^(\*|-|•)\s+", "", line)
-            html_parts.append(f"<li>{_inline_markdown_to_html(item)}</li>")
+            write("<li>")
+            write(_inline_markdown_to_html(line[1:].lstrip()))
+            write("</li>\n")
             continue
 
-        if re.match(r"^\d+\.\s+", line):
+        match = _OL_RE.match(line) if first.isdigit() else None
+        if match:
             if in_ul:
-                html_parts.append("</ul>")
+                write("</ul>\n")
                 in_ul = False
             if not in_ol:
-                html_parts.append("<ol>")
+                write("<ol>\n")
                 in_ol = True
-            item = re.sub(r"^\d+\.\s+", "", line)
-            html_parts.append(f"<li>{_inline_markdown_to_html(item)}</li>")
+            write("<li>")
+            write(_inline_markdown_to_html(line[match.end():]))
+            write("</li>\n")
             continue
 
         close_lists()
-        html_parts.append(f"<p>{_inline_markdown_to_html(line)}</p>")
+        write("<p>")
+        write(_inline_markdown_to_html(line))
+        write("</p>\n")
 
     close_lists()
-    return "\n".join(html_parts)
+    # Drop the trailing newline so the output matches a "\n".join of the parts.
+    return buf.getvalue()[:-1]
 
 
 def gemini_blog_generate(request):
@@ -153,18 +213,22 @@ def gemini_blog_generate(request):
         Avoid markdown fences.
         """
 
+        cache_key = "gemini:blog:" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()
         try:
-            if genai is None:
-                raise RuntimeError("Gemini SDK is not installed")
+            cached = cache.get(cache_key)
+            if cached:
+                article_text, article_html = cached
+            else:
+                if genai is None:
+                    raise RuntimeError("Gemini SDK is not installed")
 
-            if not settings.GEMINI_API_KEY:
-                raise RuntimeError("GEMINI_API_KEY is not configured")
+                if not settings.GEMINI_API_KEY:
+                    raise RuntimeError("GEMINI_API_KEY is not configured")
 
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            model = genai.GenerativeModel("models/gemini-2.5-flash")
-            response = model.generate_content(prompt)
-            article_text = response.text
-            article_html = _format_generated_article(article_text)
+                response = _get_model().generate_content(prompt)
+                article_text = response.text
+                article_html = _format_generated_article(article_text)
+                cache.set(cache_key, (article_text, article_html), BLOG_CACHE_TIMEOUT)
 
         except Exception as e:
             logger.exception("Gemini blog generation failed: %s", e)
@@ -181,30 +245,39 @@ def gemini_blog_generate(request):
 @login_required
 @user_passes_test(is_doctor)
 def approve_article(request, id):
-    article = get_object_or_404(Article, id=id)
-    article.status = "approved"
-    article.reviewer = request.user
-    article.reviewed_at = timezone.now()
-    article.save()
+    updated = Article.objects.filter(id=id).update(
+        status="approved",
+        reviewer=request.user,
+        reviewed_at=timezone.now(),
+    )
+    if not updated:
+        raise Http404("No Article matches the given query.")
     return redirect("review_queue")
 
 
 @login_required
 @user_passes_test(is_doctor)
 def reject_article(request, id):
-    article = get_object_or_404(Article, id=id)
-    article.status = "rejected"
-    article.reviewer = request.user
-    article.reviewed_at = timezone.now()
-    article.rejection_reason = request.POST.get("rejection_reason", "")
-    article.save()
+    updated = Article.objects.filter(id=id).update(
+        status="rejected",
+        reviewer=request.user,
+        reviewed_at=timezone.now(),
+        rejection_reason=request.POST.get("rejection_reason", ""),
+    )
+    if not updated:
+        raise Http404("No Article matches the given query.")
     return redirect("review_queue")
 
 
 @login_required
 @user_passes_test(is_doctor)
 def review_queue(request):
-    pending_articles = Article.objects.filter(status="pending")
+    pending_articles = (
+        Article.objects.filter(status="pending")
+        .select_related("author")
+        .only("id", "title", "created_at", "status", "author__username")
+        .annotate(excerpt=Substr("content", 1, 1000))
+    )
     return render(request, "articles/review_queue.html", {
         "pending_articles": pending_articles
     })
@@ -214,7 +287,7 @@ def review_queue(request):
 def my_articles(request):
     user_articles = Article.objects.filter(
         author=request.user
-    ).order_by("-created_at")
+    ).only("id", "title", "status", "created_at", "rejection_reason").order_by("-created_at")
 
     return render(request, "articles/my_article.html", {
         "user_articles": user_articles
@@ -234,7 +307,9 @@ def post_article(request):
     else:
         form = ArticleForm()
 
-    user_articles = Article.objects.filter(author=request.user)
+    user_articles = Article.objects.filter(author=request.user).only(
+        "id", "title", "status", "created_at", "rejection_reason"
+    )
 
     return render(request, "articles/my_article.html", {
         "form": form,
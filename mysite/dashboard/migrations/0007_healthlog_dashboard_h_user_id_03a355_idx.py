@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-14 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_alter_healthlog_options_remove_healthlog_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthlog',
+            index=models.Index(fields=['user', '-date'], name='dashboard_h_user_id_03a355_idx'),
+        ),
+    ]
@@ -1,7 +1,26 @@
 from django.db import models
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Cast, Least
 from django.conf import settings
 
 
+def health_score_expression():
+    """Daily health score out of 10, computed in SQL.
+
+    Sleep (8 h), water (3 L), mood (5) and exercise (60 min) each
+    contribute up to 2.5 points.
+    """
+    sleep = Cast("sleep_hours", FloatField())
+    water = Cast("water_liters", FloatField())
+    return ExpressionWrapper(
+        Least(sleep / 8.0, Value(1.0)) * 2.5
+        + Least(water / 3.0, Value(1.0)) * 2.5
+        + (F("mood") / 5.0) * 2.5
+        + Least(F("exercise_minutes") / 60.0, Value(1.0)) * 2.5,
+        output_field=FloatField(),
+    )
+
+
 class HealthLog(models.Model):
 
     MOOD_CHOICES = [
@@ -35,5 +54,10 @@ class HealthLog(models.Model):
 
     exercise_minutes = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-date"]),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.date}"
\ No newline at end of file
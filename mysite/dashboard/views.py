@@ -1,23 +1,15 @@
-from collections import defaultdict
-from datetime import datetime
-
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Avg, FloatField
+from django.db.models.functions import Cast, Round, TruncMonth
 
-from .models import HealthLog
+from .models import HealthLog, health_score_expression
 from .forms import HealthLogForm
 
-
-# ==================================
-# SCORE CALCULATION (OUT OF 10)
-# ==================================
-def calculate_score(log):
-    sleep_score = min(float(log.sleep_hours) / 8, 1) * 2.5
-    water_score = min(float(log.water_liters) / 3, 1) * 2.5
-    mood_score = (log.mood / 5) * 2.5
-    exercise_score = min(log.exercise_minutes / 60, 1) * 2.5
-
-    return round(sleep_score + water_score + mood_score + exercise_score, 2)
+# The daily charts draw only the most recent logs; the table pages through all of them.
+RECENT_LOG_LIMIT = 90
+LOGS_PER_PAGE = 20
 
 
 # ==================================
@@ -37,24 +29,31 @@ def dashboard(request):
     else:
         form = HealthLogForm()
 
-    # ---- Fetch Logs (Newest First) ----
-    logs = list(
-        HealthLog.objects.filter(user=request.user).order_by("-date")
+    # ---- Fetch Logs (Newest First, Score Computed In SQL) ----
+    logs_qs = (
+        HealthLog.objects.filter(user=request.user)
+        .annotate(
+            total_score=Round(health_score_expression(), 2),
+            sleep_hours_float=Cast("sleep_hours", FloatField()),
+        )
+        .order_by("-date")
     )
-
-    # ---- Calculate Score Per Log ----
-    for log in logs:
-        log.total_score = calculate_score(log)
+    logs = list(logs_qs[:RECENT_LOG_LIMIT])
+    page_obj = Paginator(logs_qs, LOGS_PER_PAGE).get_page(request.GET.get("page"))
 
     # ---- Calculate Averages ----
-    if logs:
-        avg_sleep = sum(float(l.sleep_hours) for l in logs) / len(logs)
-        avg_water = sum(float(l.water_liters) for l in logs) / len(logs)
-        avg_mood = sum(l.mood for l in logs) / len(logs)
-        avg_exercise = sum(l.exercise_minutes for l in logs) / len(logs)
-        avg_score = sum(l.total_score for l in logs) / len(logs)
-    else:
-        avg_sleep = avg_water = avg_mood = avg_exercise = avg_score = 0
+    averages = logs_qs.aggregate(
+        avg_sleep=Avg("sleep_hours"),
+        avg_water=Avg("water_liters"),
+        avg_mood=Avg("mood"),
+        avg_exercise=Avg("exercise_minutes"),
+        avg_score=Avg("total_score"),
+    )
+    avg_sleep = float(averages["avg_sleep"] or 0)
+    avg_water = float(averages["avg_water"] or 0)
+    avg_mood = averages["avg_mood"] or 0
+    avg_exercise = averages["avg_exercise"] or 0
+    avg_score = averages["avg_score"] or 0
 
     # ---- Personalized Tips ----
     tips = []
@@ -72,36 +71,41 @@ def dashboard(request):
         tips.append("Great job! Keep maintaining your healthy routine.")
 
     # ==================================
-    # DAILY CHART DATA
+    # DAILY CHART DATA (RECENT LOGS)
     # ==================================
-    daily_labels = [log.date.strftime("%b %d") for log in reversed(logs)]
-    sleep_data = [float(log.sleep_hours) for log in reversed(logs)]
-    mood_data = [log.mood for log in reversed(logs)]
-    exercise_data = [log.exercise_minutes for log in reversed(logs)]
-    score_data = [log.total_score for log in reversed(logs)]
+    daily_labels = []
+    sleep_data = []
+    mood_data = []
+    exercise_data = []
+    score_data = []
+
+    for log in reversed(logs):
+        daily_labels.append(log.date.strftime("%b %d"))
+        sleep_data.append(log.sleep_hours_float)
+        mood_data.append(log.mood)
+        exercise_data.append(log.exercise_minutes)
+        score_data.append(log.total_score)
 
     # ==================================
-    # MONTHLY GROUPING (MAIN CHART)
+    # MONTHLY GROUPING (MAIN CHART, ALL LOGS)
     # ==================================
-    monthly_scores = defaultdict(list)
-
-    for log in logs:
-        month_key = log.date.strftime("%b %Y")
-        monthly_scores[month_key].append(log.total_score)
-
+    monthly = (
+        logs_qs.annotate(month=TruncMonth("date"))
+        .values("month")
+        .annotate(avg=Avg("total_score"))
+        .order_by("month")
+    )
     monthly_labels = []
     monthly_avg_scores = []
 
-    for month, scores in sorted(
-        monthly_scores.items(),
-        key=lambda x: datetime.strptime(x[0], "%b %Y")
-    ):
-        monthly_labels.append(month)
-        monthly_avg_scores.append(round(sum(scores) / len(scores), 2))
+    for row in monthly:
+        monthly_labels.append(row["month"].strftime("%b %Y"))
+        monthly_avg_scores.append(round(row["avg"], 2))
 
     context = {
         "form": form,
-        "logs": logs,
+        "logs": page_obj,
+        "page_obj": page_obj,
         "avg_sleep": round(avg_sleep, 1),
         "avg_water": round(avg_water, 1),
         "avg_mood": round(avg_mood, 1),
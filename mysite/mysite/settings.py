@@ -77,6 +77,8 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 
 AUTH_USER_MODEL = 'authentication.CustomUser'
 
+SESSION_SERIALIZER = 'symptom_checker.serializers.SessionSerializer'
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -89,6 +91,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Symptom checker flow locks. Every worker process has to see the same
+    # locks, so this must be a shared backend (database, Redis or Memcached),
+    # never locmem. Create the table once with `python manage.py createcachetable`.
+    'flow_locks': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'symptom_checker_flow_locks',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -136,6 +155,9 @@ if load_dotenv:
     load_dotenv(BASE_DIR.parent / ".env")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Per-process cap on symptom checker Gemini calls; 0 disables it. Set it to
+# your quota (15 on the free tier) so bursts fail fast instead of hitting 429s.
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
 DOCTOR_DISCOVERY_PROVIDER = os.getenv("DOCTOR_DISCOVERY_PROVIDER", "osm")
 HERE_API_KEY = os.getenv("HERE_API_KEY", "")
 TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY", "")
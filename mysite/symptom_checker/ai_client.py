@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import hashlib
+import http.client
+import importlib.util
 import json
+import math
 import os
+import random
 import re
+import threading
 import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from email.utils import parsedate_to_datetime
+from string import Template
 from urllib import error as urlerror
 from urllib import request as urlrequest
 
 from django.conf import settings
+from django.core.cache import cache
 
 from symptom_checker.schemas import (
     AnswerItem,
@@ -17,10 +27,88 @@ from symptom_checker.schemas import (
     QuestionItem,
 )
 
+try:
+    import httpx
+except ModuleNotFoundError:
+    httpx = None
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*|\s*```")
+
+# Bump when prompts change so cached Gemini output from older prompts is ignored.
+PROMPT_VERSION = "2"
+QUESTIONS_CACHE_TIMEOUT = 60 * 60 * 24
+RESPONSE_CACHE_TIMEOUT = 7 * 60 * 60 * 24
+
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+GEMINI_HOST = "generativelanguage.googleapis.com"
+GEMINI_TIMEOUT = 45
+GEMINI_RETRIES = 2
+# Longest one generation can take: every attempt timing out, plus the backoff between them.
+GEMINI_CALL_BUDGET = (GEMINI_RETRIES + 1) * GEMINI_TIMEOUT + GEMINI_RETRIES * RETRY_MAX_DELAY
+# Drop pooled connections before the server's idle timeout closes them under us.
+CONNECTION_MAX_IDLE = 115.0
+
+# Built on first use by _httpx_client().
+_HTTPX_CLIENT = None
+_HTTPX_LOCK = threading.Lock()
+
+# Identical prompts already being sent, so concurrent callers share one Gemini call.
+_INFLIGHT: dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
 class AIGenerationError(RuntimeError):
     pass
 
 
+class _RetryableError(RuntimeError):
+    """A Gemini failure worth retrying: 429, 5xx, or a network/response glitch."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    """Per-process limiter so bursts fail fast instead of piling up 429 retries."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(per_minute, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token. Returns 0.0 on success, else seconds until one frees up."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
 def _read_config(name: str, default: str = "") -> str:
     candidates = [os.getenv(name), getattr(settings, name, None), default]
     for raw in candidates:
@@ -34,12 +122,26 @@ def _read_config(name: str, default: str = "") -> str:
     return ""
 
 
+# Off unless GEMINI_REQUESTS_PER_MINUTE is set (see settings.py).
+_GEMINI_BUCKET = _TokenBucket(float(_read_config("GEMINI_REQUESTS_PER_MINUTE", "0")))
+
+
+def _prompt_cache_key(prefix: str, prompt: str) -> str:
+    digest = hashlib.sha256(f"{PROMPT_VERSION}\0{prompt}".encode("utf-8")).hexdigest()
+    return f"gemini:{prefix}:{digest}"
+
+
 def _parse_json(text: str):
-    cleaned = (text or "").replace("```json", "").replace("```", "").strip()
-    return json.loads(cleaned)
+    cleaned = _FENCE_RE.sub("", text or "").strip()
+    return _json_loads(cleaned)
 
 
-def _generate_content_with_retry(prompt: str, *, retries: int = 2):
+def _generate_content_with_retry(prompt: str, parse, *, retries: int = GEMINI_RETRIES):
+    """Send ``prompt`` and return ``parse(reply)``.
+
+    Replies are cached only once ``parse`` accepts them, so a malformed
+    generation is retried with a fresh call instead of being replayed.
+    """
     api_key = _read_config("GEMINI_API_KEY")
     model = _read_config("GEMINI_MODEL", "gemini-2.5-flash")
     if not api_key:
@@ -47,54 +149,117 @@ def _generate_content_with_retry(prompt: str, *, retries: int = 2):
             "Gemini API key missing. Set GEMINI_API_KEY in .env and restart server."
         )
 
+    cache_key = _prompt_cache_key("response", f"{model}\0{prompt}")
+    cached = cache.get(cache_key)
+    if cached:
+        return parse(cached)
+
+    with _INFLIGHT_LOCK:
+        pending = _INFLIGHT.get(cache_key)
+        is_leader = pending is None
+        if is_leader:
+            pending = _INFLIGHT[cache_key] = Future()
+    if not is_leader:
+        try:
+            return pending.result(timeout=GEMINI_CALL_BUDGET)
+        except FutureTimeoutError:
+            # The leader is stuck past its whole budget; stop waiting and call directly.
+            content = _call_gemini_with_retry(prompt, api_key=api_key, model=model, retries=retries)
+            result = parse(content)
+            cache.set(cache_key, content, RESPONSE_CACHE_TIMEOUT)
+            return result
+
+    try:
+        content = _call_gemini_with_retry(prompt, api_key=api_key, model=model, retries=retries)
+        result = parse(content)
+    except BaseException as exc:
+        pending.set_exception(exc)
+        raise
+    else:
+        cache.set(cache_key, content, RESPONSE_CACHE_TIMEOUT)
+        pending.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(cache_key, None)
+
+
+def _call_gemini_with_retry(prompt: str, *, api_key: str, model: str, retries: int) -> str:
     last_error = None
     for attempt in range(retries + 1):
+        wait = _GEMINI_BUCKET.try_acquire()
+        if wait:
+            raise AIGenerationError(
+                f"Gemini is busy right now. Please retry in about {math.ceil(wait)} seconds."
+            )
         try:
             return _call_gemini(prompt=prompt, api_key=api_key, model=model)
+        except _RetryableError as exc:
+            last_error = exc
+            delay = _retry_delay(exc, attempt)
+            # Don't hold the request for longer than the cap; report the limit instead.
+            if attempt < retries and delay <= RETRY_MAX_DELAY:
+                time.sleep(delay)
+                continue
+            break
         except Exception as exc:
+            # Key, permission, and model errors won't fix themselves on retry.
             last_error = exc
-            if attempt < retries:
-                time.sleep(0.6 * (attempt + 1))
+            break
     raise AIGenerationError(_friendly_error(last_error))
 
 
-def _call_gemini(*, prompt: str, api_key: str, model: str) -> str:
-    body = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {
-                        "text": (
-                            "You are a strict JSON generator. Return only valid JSON.\n\n"
-                            + prompt
-                        )
-                    }
-                ],
-            }
-        ],
+def _retry_delay(exc: _RetryableError, attempt: int) -> float:
+    if exc.retry_after is not None:
+        return exc.retry_after
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt) * random.uniform(0.5, 1.5)
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_JSON_INSTRUCTION = "You are a strict JSON generator. Return only valid JSON.\n\n"
+_BODY_PREFIX, _BODY_SUFFIX = _json_dumps(
+    {
+        "contents": [{"role": "user", "parts": [{"text": None}]}],
         "generationConfig": {"temperature": 0.2},
     }
-    req = urlrequest.Request(
-        f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}",
-        data=json.dumps(body).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
+).split(b"null", 1)
+
+
+def _call_gemini(*, prompt: str, api_key: str, model: str) -> str:
+    # Only the prompt text varies; the JSON around it is encoded once at import.
+    body = b"".join((_BODY_PREFIX, _json_dumps(_JSON_INSTRUCTION + prompt), _BODY_SUFFIX))
     try:
-        with urlrequest.urlopen(req, timeout=45) as resp:
-            payload = json.loads(resp.read().decode("utf-8"))
-    except urlerror.HTTPError as exc:
-        raw = exc.read().decode("utf-8", errors="ignore")
-        raise RuntimeError(f"HTTP {exc.code}: {raw}") from exc
+        status, headers, raw = _post_json(
+            f"/v1beta/models/{model}:generateContent?key={api_key}",
+            body,
+        )
+    except Exception as exc:
+        raise _RetryableError(str(exc)) from exc
+    if status >= 400:
+        message = f"HTTP {status}: {raw.decode('utf-8', errors='ignore')}"
+        if status == 429 or status >= 500:
+            raise _RetryableError(message, _parse_retry_after(headers.get("Retry-After")))
+        raise RuntimeError(message)
+    try:
+        payload = _json_loads(raw)
     except Exception as exc:
-        raise RuntimeError(str(exc)) from exc
+        raise _RetryableError(str(exc)) from exc
 
     candidates = payload.get("candidates") or []
     if not candidates:
-        raise RuntimeError("Gemini returned no candidates.")
+        raise _RetryableError("Gemini returned no candidates.")
     parts = ((candidates[0].get("content") or {}).get("parts") or [])
     content = ""
     for part in parts:
@@ -102,10 +267,51 @@ def _call_gemini(*, prompt: str, api_key: str, model: str) -> str:
         if text:
             content += text
     if not content:
-        raise RuntimeError("Gemini returned empty content.")
+        raise _RetryableError("Gemini returned empty content.")
     return content
 
 
+def _httpx_client():
+    """The shared httpx pool, or None when httpx isn't installed.
+
+    Every thread shares one pool, multiplexed over HTTP/2 when h2 is available.
+    """
+    global _HTTPX_CLIENT
+    if httpx is None:
+        return None
+    if _HTTPX_CLIENT is None:
+        with _HTTPX_LOCK:
+            if _HTTPX_CLIENT is None:
+                _HTTPX_CLIENT = httpx.Client(
+                    base_url=f"https://{GEMINI_HOST}",
+                    http2=importlib.util.find_spec("h2") is not None,
+                    timeout=GEMINI_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=20, keepalive_expiry=CONNECTION_MAX_IDLE
+                    ),
+                )
+    return _HTTPX_CLIENT
+
+
+def _post_json(
+    path: str, body: bytes
+) -> tuple[int, http.client.HTTPMessage | httpx.Headers, bytes]:
+    headers = {"Content-Type": "application/json"}
+    client = _httpx_client()
+    if client is not None:
+        # httpx retires stale pooled connections itself.
+        resp = client.post(path, content=body, headers=headers)
+        return resp.status_code, resp.headers, resp.content
+    # Without httpx every call opens its own connection, but urllib still
+    # honours HTTP(S)_PROXY and follows redirects.
+    req = urlrequest.Request(f"https://{GEMINI_HOST}{path}", data=body, headers=headers, method="POST")
+    try:
+        with urlrequest.urlopen(req, timeout=GEMINI_TIMEOUT) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urlerror.HTTPError as exc:
+        return exc.code, exc.headers, exc.read()
+
+
 def _friendly_error(exc: Exception | None) -> str:
     message = str(exc or "")
     lowered = message.lower()
@@ -145,19 +351,37 @@ def _validate_question(row: dict, idx: int) -> QuestionItem:
     return item
 
 
-def generate_questions(intake: IntakeData) -> list[QuestionItem]:
-    prompt = f"""
+_QUESTIONS_PROMPT = Template(
+    """
 You are a medical intake assistant.
-Generate exactly 15 follow-up triage questions for this user.
-Return ONLY valid JSON array, no markdown.
+Generate exactly 15 follow-up triage questions for this user, plus a scoring plan
+for the conditions those questions are meant to tell apart.
+Return ONLY a valid JSON object, no markdown.
 
-Each item schema:
-{{
-  "id": 1,
-  "text": "question text",
-  "type": "yesno | text | single_choice",
-  "options": ["option 1", "option 2"]
-}}
+Schema:
+{
+  "questions": [
+    {
+      "id": 1,
+      "text": "question text",
+      "type": "yesno | text | single_choice",
+      "options": ["option 1", "option 2"],
+      "ai_generated": true
+    }
+  ],
+  "plan": {
+    "conditions": [
+      {
+        "name": "Condition",
+        "reasoning": "short explanation",
+        "specialization": "doctor specialization",
+        "urgency": "Low | Moderate | High",
+        "yes_signals": [1, 4, 7]
+      }
+    ],
+    "advice": "short actionable guidance"
+  }
+}
 
 Rules:
 - Keep questions concise and practical.
@@ -166,29 +390,100 @@ Rules:
 - If single_choice, provide 2-4 options.
 - Do not repeat questions.
 - Ensure all 15 questions are clinically meaningful and non-redundant.
-- This must be AI-generated output. Include "ai_generated": true in every item.
+- This must be AI-generated output. Include "ai_generated": true in every question.
+- In the plan, list 3-5 candidate conditions. "yes_signals" are the ids of yesno
+  questions where a "yes" answer supports that condition.
 
 User profile:
-Age: {intake.age}
-Gender: {intake.gender}
-State: {intake.state}
-Primary symptom: {intake.symptom}
+Age: $age
+Gender: $gender
+State: $state
+Primary symptom: $symptom
 """
+)
+
+
+def _age_cohort(age: int | None) -> str:
+    if age is None:
+        return "not given"
+    decade = age // 10 * 10
+    return f"{decade}-{decade + 9}"
+
+
+def _questions_prompt(intake: IntakeData) -> str:
+    # Question sets are shared per age decade (see _questions_cache_key), so the
+    # prompt gets the decade too, never one member's exact age.
+    return _QUESTIONS_PROMPT.substitute(
+        age=_age_cohort(intake.age),
+        gender=intake.gender,
+        state=intake.state,
+        symptom=intake.symptom,
+    )
+
 
-    response = _generate_content_with_retry(prompt)
+def _questions_cache_key(intake: IntakeData) -> str:
+    # Intakes from the same cohort (symptom, age decade, gender, state) share one
+    # question set, so repeat cohorts skip Gemini even when the exact ages differ.
+    cohort = "|".join(
+        [
+            " ".join(intake.symptom.lower().split()),
+            _age_cohort(intake.age),
+            intake.gender.strip().lower(),
+            intake.state.strip().lower(),
+        ]
+    )
+    return _prompt_cache_key("questions", cohort)
+
+
+def _validate_plan(raw, question_ids: set[int]) -> dict | None:
+    # The plan only lets us skip the diagnosis call; a bad plan is dropped, not fatal.
+    if not isinstance(raw, dict):
+        return None
+    conditions = []
+    for row in raw.get("conditions") or []:
+        if not isinstance(row, dict):
+            continue
+        name = str(row.get("name") or "").strip()
+        urgency = str(row.get("urgency") or "").strip().title()
+        try:
+            signals = sorted({int(qid) for qid in row.get("yes_signals") or []} & question_ids)
+        except (TypeError, ValueError):
+            continue
+        if not name or not signals or urgency not in {"Low", "Moderate", "High"}:
+            continue
+        conditions.append(
+            {
+                "name": name,
+                "reasoning": str(row.get("reasoning") or "").strip(),
+                "specialization": str(row.get("specialization") or "").strip(),
+                "urgency": urgency,
+                "yes_signals": signals,
+            }
+        )
+    advice = str(raw.get("advice") or "").strip()
+    if not conditions or not advice:
+        return None
+    return {"conditions": conditions, "advice": advice}
+
+
+def _parse_questions(response: str) -> tuple[list[QuestionItem], dict | None]:
     try:
         parsed = _parse_json(response)
     except Exception as exc:
         raise AIGenerationError(f"Could not parse AI questions JSON: {exc}") from exc
 
-    if not isinstance(parsed, list):
-        raise AIGenerationError("AI questions response must be a JSON array.")
-    if len(parsed) != 15:
+    if isinstance(parsed, dict):
+        rows, raw_plan = parsed.get("questions"), parsed.get("plan")
+    else:
+        rows, raw_plan = parsed, None
+    if not isinstance(rows, list):
+        raise AIGenerationError("AI questions response must include a JSON array of questions.")
+    if len(rows) != 15:
         raise AIGenerationError("AI must return exactly 15 questions.")
 
     questions: list[QuestionItem] = []
     seen: set[str] = set()
-    for idx, row in enumerate(parsed, start=1):
+    for idx, row in enumerate(rows, start=1):
         if not isinstance(row, dict):
             raise AIGenerationError("AI question items must be JSON objects.")
         if row.get("ai_generated") is not True:
@@ -199,44 +494,142 @@ Primary symptom: {intake.symptom}
             raise AIGenerationError("AI returned duplicate questions.")
         seen.add(signature)
         questions.append(question)
+
+    yesno_ids = {question.id for question in questions if question.type == "yesno"}
+    plan = _validate_plan(raw_plan, yesno_ids)
+    return questions, plan
+
+
+def generate_questions_and_plan(intake: IntakeData) -> tuple[list[QuestionItem], dict | None]:
+    cache_key = _questions_cache_key(intake)
+    cached = cache.get(cache_key)
+    if cached:
+        return [QuestionItem.from_dict(row) for row in cached["questions"]], cached["plan"]
+
+    questions, plan = _generate_content_with_retry(_questions_prompt(intake), _parse_questions)
+    cache.set(
+        cache_key,
+        {"questions": [question.to_dict() for question in questions], "plan": plan},
+        QUESTIONS_CACHE_TIMEOUT,
+    )
+    return questions, plan
+
+
+def generate_questions(intake: IntakeData) -> list[QuestionItem]:
+    questions, _plan = generate_questions_and_plan(intake)
     return questions
 
 
-def generate_diagnosis(intake: IntakeData, answers: list[AnswerItem]) -> DiagnosisResult:
-    answer_lines = "\n".join(
-        f"- Q: {answer.question_text} | A: {answer.answer}" for answer in answers
+def cached_plan(intake: IntakeData) -> dict | None:
+    """The scoring plan Gemini returned with this intake's questions, if still cached."""
+    cached = cache.get(_questions_cache_key(intake))
+    if not cached:
+        return None
+    return cached.get("plan")
+
+
+def _diagnosis_from_plan(intake: IntakeData, answers: list[AnswerItem]) -> DiagnosisResult | None:
+    cached = cache.get(_questions_cache_key(intake))
+    if not cached or not cached.get("plan"):
+        return None
+    questions = [QuestionItem.from_dict(row) for row in cached["questions"]]
+    return diagnosis_from_plan(cached["plan"], questions, answers)
+
+
+def diagnosis_from_plan(
+    plan: dict, questions: list[QuestionItem], answers: list[AnswerItem]
+) -> DiagnosisResult | None:
+    """Score ``answers`` against a plan; None when the session strayed from it."""
+    # Only score locally when every answer is a plain yes/no to the planned questions.
+    asked = {(question.id, question.text) for question in questions if question.type == "yesno"}
+    if len(answers) != len(questions):
+        return None
+    yes_ids: set[int] = set()
+    for answer in answers:
+        value = answer.answer.strip().lower()
+        if (answer.question_id, answer.question_text) not in asked or value not in {"yes", "no"}:
+            return None
+        if value == "yes":
+            yes_ids.add(answer.question_id)
+
+    scored = []
+    for row in plan["conditions"]:
+        ratio = len(yes_ids.intersection(row["yes_signals"])) / len(row["yes_signals"])
+        if ratio > 0:
+            scored.append((ratio, row))
+    if not scored:
+        return None
+    scored.sort(key=lambda item: item[0], reverse=True)
+    conditions = [
+        DiagnosisCondition(
+            name=row["name"],
+            likelihood="High" if ratio >= 0.67 else "Medium" if ratio >= 0.34 else "Low",
+            reasoning=row["reasoning"],
+            specialization=row["specialization"],
+        )
+        for ratio, row in scored[:3]
+    ]
+    return DiagnosisResult(
+        conditions=conditions,
+        urgency=scored[0][1]["urgency"],
+        advice=plan["advice"],
+        from_plan=True,
     )
-    prompt = f"""
+
+
+_DIAGNOSIS_PROMPT = Template(
+    """
 You are a clinical triage assistant.
 Analyze user intake and follow-up responses.
 Return ONLY valid JSON object, no markdown.
 
 Schema:
-{{
+{
   "conditions": [
-    {{
+    {
       "name": "Condition",
       "likelihood": "High | Medium | Low",
       "reasoning": "short explanation",
       "specialization": "doctor specialization"
-    }}
+    }
   ],
   "urgency": "Low | Moderate | High",
   "advice": "short actionable guidance",
   "ai_generated": true
-}}
+}
 
 User profile:
-Age: {intake.age}
-Gender: {intake.gender}
-State: {intake.state}
-Primary symptom: {intake.symptom}
+Age: $age
+Gender: $gender
+State: $state
+Primary symptom: $symptom
 
 Follow-up answers:
-{answer_lines}
+$answer_lines
 """
+)
+
+
+def generate_diagnosis(intake: IntakeData, answers: list[AnswerItem]) -> DiagnosisResult:
+    answer_lines = "\n".join(
+        f"- Q: {answer.question_text} | A: {answer.answer}" for answer in answers
+    )
+    planned = _diagnosis_from_plan(intake, answers)
+    if planned is not None:
+        return planned
+
+    prompt = _DIAGNOSIS_PROMPT.substitute(
+        age=intake.age,
+        gender=intake.gender,
+        state=intake.state,
+        symptom=intake.symptom,
+        answer_lines=answer_lines,
+    )
+
+    return _generate_content_with_retry(prompt, _parse_diagnosis)
+
 
-    response = _generate_content_with_retry(prompt)
+def _parse_diagnosis(response: str) -> DiagnosisResult:
     try:
         parsed = _parse_json(response)
     except Exception as exc:
@@ -1,5 +1,20 @@
 from django.apps import AppConfig
 
+# Parsed at startup so the first symptom check doesn't pay for it; the cached
+# loader keeps them compiled from then on.
+WARM_TEMPLATES = (
+    "symptom_checker/start.html",
+    "symptom_checker/question.html",
+    "symptom_checker/result.html",
+)
+
 
 class SymptomCheckerConfig(AppConfig):
     name = 'symptom_checker'
+
+    def ready(self):
+        import symptom_checker.signals
+        from django.template.loader import get_template
+
+        for template_name in WARM_TEMPLATES:
+            get_template(template_name)
@@ -1,13 +1,36 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import math
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from urllib.parse import quote_plus
 
-from symptom_checker.ai_client import AIGenerationError, generate_diagnosis, generate_questions
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+
+from symptom_checker.ai_client import (
+    GEMINI_CALL_BUDGET,
+    AIGenerationError,
+    cached_plan,
+    diagnosis_from_plan,
+    generate_diagnosis,
+    generate_questions,
+)
 from symptom_checker.diagnosis import build_result_payload
-from symptom_checker.models import Doctor
-from symptom_checker.question_flow import append_answer, current_question, next_index
-from symptom_checker.schemas import AnswerItem, DiagnosisResult, IntakeData, QuestionItem
+from symptom_checker.question_flow import (
+    answers_with_text,
+    append_answer,
+    current_question,
+    load_question,
+    next_index,
+)
+from symptom_checker.registry import doctors_by_specialization
+from symptom_checker.schemas import DiagnosisResult, IntakeData
 from symptom_checker.services.doctor_discovery import discover_nearby_doctors
 from symptom_checker.services.recommendations import (
     issue_collectible_tag,
@@ -17,6 +40,24 @@ from symptom_checker.services.recommendations import (
 
 SESSION_KEY = "symptom_checker_flow"
 
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+# Network calls (Gemini, doctor discovery) run here so the request thread isn't
+# stuck waiting on them one at a time.
+_NETWORK_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="symptom-net")
+
+EXTERNAL_DOCTORS_CACHE_TIMEOUT = 6 * 60 * 60
+RESULT_PAGE_CACHE_TIMEOUT = 60 * 60
+# Held across a diagnosis call with all its retries, plus time to build the page.
+FLOW_LOCK_TIMEOUT = math.ceil(GEMINI_CALL_BUDGET) + 30
+# How long a request waits for another one's lock before giving up.
+FLOW_LOCK_WAIT = 30
+# Releases this close to the lock's expiry leave the key to lapse on its own.
+FLOW_LOCK_RELEASE_MARGIN = 2
+FLOW_LOCK_POLL = 0.05
+# Locks have to be seen by every worker process; see CACHES in settings.py.
+FLOW_LOCK_CACHE = "flow_locks"
+
 SPECIALIZATION_KEYWORDS = {
     "dermatologist": {"skin", "fungal", "eczema", "psoriasis", "rash", "acne", "dermatitis"},
     "infectious disease specialist": {
@@ -51,6 +92,14 @@ SPECIALIZATION_KEYWORDS = {
     "general physician": set(),
 }
 
+# Inverted once at import so each token is a single lookup. Matching stays on
+# whole tokens, so multi-word keywords ("chest pain") never match, as before.
+_KEYWORD_TO_SPECIALIST = {
+    keyword: specialist
+    for specialist, keywords in SPECIALIZATION_KEYWORDS.items()
+    for keyword in keywords
+}
+
 
 def _initial_state() -> dict:
     return {
@@ -58,14 +107,24 @@ def _initial_state() -> dict:
         "questions": [],
         "answers": [],
         "current_index": 0,
+        "progress": 0,
         "diagnosis": None,
         "diagnosis_error": "",
+        "specializations": None,
+        "diagnosis_hash": "",
+        "prefetch": None,
         "ai_calls": {"questions": 0, "diagnosis": 0},
     }
 
 
 def _flow(request) -> dict:
-    return request.session.get(SESSION_KEY, _initial_state())
+    # The session decodes once per request; only build the empty state when needed.
+    flow = request.session.get(SESSION_KEY)
+    return _initial_state() if flow is None else flow
+
+
+def _is_active(flow: dict) -> bool:
+    return bool(flow.get("questions")) and bool(flow.get("intake"))
 
 
 def _save_flow(request, flow: dict) -> None:
@@ -75,51 +134,141 @@ def _save_flow(request, flow: dict) -> None:
 
 def start_session(request, intake: IntakeData) -> None:
     ai_questions = generate_questions(intake)
-    questions = [question.to_dict() for question in ai_questions]
+    with flow_lock(request):
+        _store_new_flow(request, intake, ai_questions)
+
+
+async def astart_session(request, intake: IntakeData) -> None:
+    # Gemini doesn't touch the database, so it needn't wait for the request's
+    # DB thread; only storing the flow does.
+    ai_questions = await sync_to_async(generate_questions, thread_sensitive=False)(intake)
+    async with aflow_lock(request):
+        await sync_to_async(_store_new_flow)(request, intake, ai_questions)
+
+
+def _store_new_flow(request, intake: IntakeData, ai_questions: list) -> None:
+    questions = [question.to_tuple() for question in ai_questions]
     flow = _initial_state()
     flow["intake"] = intake.to_dict()
     flow["questions"] = questions
     flow["answers"] = []
     flow["current_index"] = 0
+    flow["progress"] = _progress(0, len(questions))
     flow["diagnosis"] = None
     flow["diagnosis_error"] = ""
+    # The questions call also returned a scoring plan; keeping it with the flow
+    # lets the result page skip the diagnosis call even if the cache drops it.
+    flow["prefetch"] = cached_plan(intake)
     flow["ai_calls"] = {"questions": 1, "diagnosis": 0}
     _save_flow(request, flow)
 
 
+class FlowBusyError(RuntimeError):
+    """Another request is still changing this session's flow."""
+
+
+def _lock_key(request) -> str | None:
+    session_key = request.session.session_key
+    return f"symptom_checker:lock:{session_key}" if session_key else None
+
+
+def _release_lock(lock_key: str, acquired_at: float) -> None:
+    # The cache has no compare-and-delete, so release only while the
+    # timeout guarantees the key is still ours; after that, let it expire.
+    if time.monotonic() - acquired_at < FLOW_LOCK_TIMEOUT - FLOW_LOCK_RELEASE_MARGIN:
+        caches[FLOW_LOCK_CACHE].delete(lock_key)
+
+
+@contextmanager
+def flow_lock(request):
+    """Serialize requests that change one session's flow.
+
+    Enter before anything reads ``request.session``, so the flow is loaded
+    only once the lock is held; it is saved before the lock is released.
+    Raises FlowBusyError when the lock isn't free within FLOW_LOCK_WAIT.
+    """
+    lock_key = _lock_key(request)
+    if lock_key is None:
+        yield
+        return
+
+    locks = caches[FLOW_LOCK_CACHE]
+    deadline = time.monotonic() + FLOW_LOCK_WAIT
+    while not locks.add(lock_key, 1, FLOW_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise FlowBusyError("This symptom check is still being updated by another request.")
+        time.sleep(FLOW_LOCK_POLL)
+    acquired_at = time.monotonic()
+    try:
+        yield
+        if request.session.modified:
+            request.session.save()
+    finally:
+        _release_lock(lock_key, acquired_at)
+
+
+@asynccontextmanager
+async def aflow_lock(request):
+    """flow_lock for async views: waiting for the lock doesn't hold a thread."""
+    lock_key = _lock_key(request)
+    if lock_key is None:
+        yield
+        return
+
+    locks = caches[FLOW_LOCK_CACHE]
+    deadline = time.monotonic() + FLOW_LOCK_WAIT
+    while not await locks.aadd(lock_key, 1, FLOW_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise FlowBusyError("This symptom check is still being updated by another request.")
+        await asyncio.sleep(FLOW_LOCK_POLL)
+    acquired_at = time.monotonic()
+    try:
+        yield
+        if request.session.modified:
+            await sync_to_async(request.session.save)()
+    finally:
+        await sync_to_async(_release_lock)(lock_key, acquired_at)
+
+
 def has_active_session(request) -> bool:
-    flow = _flow(request)
-    return bool(flow.get("questions")) and bool(flow.get("intake"))
+    return _is_active(_flow(request))
 
 
 def question_context(request) -> dict:
     flow = _flow(request)
-    questions = [QuestionItem.from_dict(row) for row in flow.get("questions", [])]
+    questions = flow.get("questions", [])
     idx = int(flow.get("current_index", 0))
     question = current_question(questions, idx)
     total = len(questions)
+    # Stored whenever the step changes; older flows without it are computed here.
+    progress = flow.get("progress")
+    if progress is None:
+        progress = _progress(idx, total)
     return {
-        "has_session": has_active_session(request),
+        "has_session": _is_active(flow),
         "completed": question is None,
         "question": question,
         "step": idx + 1,
         "total": total,
-        "progress": int(((idx + 1) / total) * 100) if total else 0,
+        "progress": progress,
     }
 
 
+def _progress(idx: int, total: int) -> int:
+    return int(((idx + 1) / total) * 100) if total else 0
+
+
 def submit_answer(request, answer_value: str) -> bool:
     flow = _flow(request)
-    questions = [QuestionItem.from_dict(row) for row in flow.get("questions", [])]
-    answers = [AnswerItem.from_dict(row) for row in flow.get("answers", [])]
+    questions = flow.get("questions", [])
     idx = int(flow.get("current_index", 0))
     question = current_question(questions, idx)
     if question is None:
         return True
 
-    updated_answers = append_answer(answers, question, answer_value)
-    flow["answers"] = [answer.to_dict() for answer in updated_answers]
+    flow["answers"] = append_answer(flow.get("answers", []), question, answer_value)
     flow["current_index"] = next_index(idx)
+    flow["progress"] = _progress(flow["current_index"], len(questions))
     _save_flow(request, flow)
     return flow["current_index"] >= len(questions)
 
@@ -129,7 +278,7 @@ def _top_conditions_from_diagnosis(condition_names: list[str]) -> list[str]:
 
 
 def _tokenize(text: str) -> set[str]:
-    return {t for t in re.split(r"[^a-zA-Z0-9]+", (text or "").lower()) if t}
+    return {match.group(0).lower() for match in _TOKEN_RE.finditer(text or "")}
 
 
 def _recommended_specializations(condition_rows: list[dict]) -> list[str]:
@@ -156,12 +305,15 @@ def _recommended_specializations(condition_rows: list[dict]) -> list[str]:
         for row in condition_rows
         if isinstance(row, dict)
     )
-    tokens = _tokenize(combined_text)
-    for specialist, keywords in SPECIALIZATION_KEYWORDS.items():
-        if keywords and tokens.intersection(keywords):
-            if specialist not in seen:
-                seen.add(specialist)
-                recommended.append(specialist.title())
+    matched = {
+        _KEYWORD_TO_SPECIALIST[token]
+        for token in _tokenize(combined_text)
+        if token in _KEYWORD_TO_SPECIALIST
+    }
+    for specialist in SPECIALIZATION_KEYWORDS:
+        if specialist in matched and specialist not in seen:
+            seen.add(specialist)
+            recommended.append(specialist.title())
 
     if not recommended:
         recommended.append("General Physician")
@@ -173,41 +325,55 @@ def _doctors_for_specializations(specializations: list[str]) -> list[dict]:
     if not normalized_specs:
         return []
 
-    doctors = Doctor.objects.all()
+    # Match whole specialization groups from the registry instead of every row.
+    matches = sorted(
+        entry
+        for doc_spec, entries in doctors_by_specialization().items()
+        if any(spec in doc_spec for spec in normalized_specs)
+        for entry in entries
+    )
+    doctors = [row for _position, row in matches[:6]]
     result = []
     for doctor in doctors:
-        doc_spec = (doctor.specialization or "").lower()
-        if any(spec in doc_spec for spec in normalized_specs):
-            city = doctor.city or ""
-            query = quote_plus(f"{doctor.name} {doctor.specialization} {city}".strip())
-            map_search_url = f"https://www.google.com/maps/search/?api=1&query={query}"
-            result.append(
-                {
-                    "name": doctor.name,
-                    "specialization": doctor.specialization,
-                    "city": city,
-                    "phone": doctor.phone,
-                    "email": doctor.email,
-                    "latitude": doctor.latitude,
-                    "longitude": doctor.longitude,
-                    "map_search_url": map_search_url,
-                    "source": "HealthSync DB",
-                }
-            )
-    return result[:6]
-
-
-def _external_doctor_matches(specializations: list[str], intake: IntakeData) -> list[dict]:
+        city = doctor["city"] or ""
+        query = quote_plus(f"{doctor['name']} {doctor['specialization']} {city}".strip())
+        result.append(
+            {
+                **doctor,
+                "city": city,
+                "map_search_url": f"https://www.google.com/maps/search/?api=1&query={query}",
+                "source": "HealthSync DB",
+            }
+        )
+    return result
+
+
+def _cached_nearby_doctors(location: str, specialization: str) -> list[dict]:
+    digest = hashlib.sha256(f"{location.lower()}\0{specialization.lower()}".encode("utf-8"))
+    cache_key = f"docdisc:{digest.hexdigest()}"
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = discover_nearby_doctors(location=location, specialization=specialization, limit=4)
+        # Discovery returns [] on provider errors; don't pin that for hours.
+        if rows:
+            cache.set(cache_key, rows, EXTERNAL_DOCTORS_CACHE_TIMEOUT)
+    return rows
+
+
+def _start_external_doctor_lookups(specializations: list[str], intake: IntakeData):
+    """Submit the provider lookups now; pass the result to _external_doctor_matches."""
     scoped_specializations = [s for s in specializations if s and s.strip()] or ["General Physician"]
     location = intake.state or "India"
+    return _NETWORK_EXECUTOR.map(
+        lambda specialization: _cached_nearby_doctors(location, specialization),
+        scoped_specializations[:3],
+    )
+
+
+def _external_doctor_matches(lookups) -> list[dict]:
     found: list[dict] = []
     seen_names: set[str] = set()
-    for specialization in scoped_specializations[:3]:
-        rows = discover_nearby_doctors(
-            location=location,
-            specialization=specialization,
-            limit=4,
-        )
+    for rows in lookups:
         for row in rows:
             name_key = (row.get("name") or "").strip().lower()
             if not name_key or name_key in seen_names:
@@ -221,7 +387,7 @@ def _external_doctor_matches(specializations: list[str], intake: IntakeData) ->
 
 def get_or_build_result(request) -> dict:
     flow = _flow(request)
-    if not has_active_session(request):
+    if not _is_active(flow):
         return {}
 
     if flow.get("diagnosis"):
@@ -229,13 +395,21 @@ def get_or_build_result(request) -> dict:
         diagnosis_error = flow.get("diagnosis_error", "")
     else:
         intake = IntakeData.from_dict(flow["intake"])
-        answers = [AnswerItem.from_dict(row) for row in flow.get("answers", [])]
+        answers = answers_with_text(flow.get("questions", []), flow.get("answers", []))
+        planned = None
+        if flow.get("prefetch"):
+            questions = [load_question(row) for row in flow["questions"]]
+            planned = diagnosis_from_plan(flow["prefetch"], questions, answers)
+        if planned is None:
+            pending = _NETWORK_EXECUTOR.submit(generate_diagnosis, intake, answers)
+        # Warm the doctor registry while Gemini works; it doesn't depend on the result.
+        doctors_by_specialization()
         try:
-            diagnosis = generate_diagnosis(intake, answers)
+            diagnosis = planned or pending.result()
             diagnosis_payload = diagnosis.to_dict()
             diagnosis_error = ""
             flow["diagnosis"] = diagnosis_payload
-            flow["ai_calls"]["diagnosis"] = 1
+            flow["ai_calls"]["diagnosis"] = 0 if diagnosis.from_plan else 1
         except AIGenerationError as exc:
             diagnosis_payload = DiagnosisResult(
                 conditions=[],
@@ -252,13 +426,23 @@ def get_or_build_result(request) -> dict:
     )
 
     condition_rows = diagnosis_payload.get("conditions", []) or []
-    target_specializations = _recommended_specializations(condition_rows)
+    # A flow's diagnosis never changes, so its specializations are only worked out once.
+    target_specializations = flow.get("specializations")
+    if target_specializations is None:
+        target_specializations = _recommended_specializations(condition_rows)
+        flow["specializations"] = target_specializations
+        flow["diagnosis_hash"] = _diagnosis_hash(flow)
+        _save_flow(request, flow)
     top_condition_names = _top_conditions_from_diagnosis(
         [row.get("name", "") for row in condition_rows if isinstance(row, dict)]
     )
     intake = IntakeData.from_dict(flow.get("intake", {}))
+    # Provider lookups run on the network pool while the registry match and the
+    # article query run here.
+    external_lookups = _start_external_doctor_lookups(target_specializations, intake)
     db_docs = _doctors_for_specializations(target_specializations)
-    external_docs = _external_doctor_matches(target_specializations, intake)
+    recommended_reads = recommended_articles(top_condition_names)
+    external_docs = _external_doctor_matches(external_lookups)
     recommended_docs = db_docs[:]
     known_names = {(d.get("name") or "").strip().lower() for d in recommended_docs}
     for doc in external_docs:
@@ -268,13 +452,12 @@ def get_or_build_result(request) -> dict:
             recommended_docs.append(doc)
         if len(recommended_docs) >= 6:
             break
-    recommended_reads = recommended_articles(top_condition_names)
     collectible = issue_collectible_tag()
 
     built["recommended_doctors"] = recommended_docs
     built["recommended_specializations"] = target_specializations
     built["recommended_articles"] = recommended_reads
-    built["ai_calls"] = flow.get("ai_calls", {"questions": 1, "diagnosis": 1})
+    built["ai_calls"] = flow.get("ai_calls", {"questions": 0, "diagnosis": 0})
     built["ai_error"] = diagnosis_error
     if collectible and getattr(collectible, "tag_code", ""):
         built["community_collectible"] = {
@@ -287,6 +470,31 @@ def get_or_build_result(request) -> dict:
     return built
 
 
+def _diagnosis_hash(flow: dict) -> str:
+    # Everything the result page is built from; doctor and article lookups
+    # follow from the intake and diagnosis.
+    payload = json.dumps(
+        [flow.get("intake"), flow.get("diagnosis"), flow.get("diagnosis_error"), flow.get("ai_calls")],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def diagnosis_hash(request) -> str | None:
+    """Fingerprint of this flow's result page, once its diagnosis is settled."""
+    return _flow(request).get("diagnosis_hash") or None
+
+
+def result_page_cache_key(request) -> str | None:
+    """Cache key for this flow's rendered result page, once its diagnosis is settled."""
+    settled_hash = diagnosis_hash(request)
+    session_key = request.session.session_key
+    if not settled_hash or not session_key:
+        return None
+    return f"symptom_checker:result:{session_key}:{settled_hash}"
+
+
 def reset_session(request) -> None:
     if SESSION_KEY in request.session:
         del request.session[SESSION_KEY]
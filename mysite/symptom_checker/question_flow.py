@@ -2,25 +2,39 @@ from __future__ import annotations
 
 from symptom_checker.schemas import AnswerItem, QuestionItem
 
+# The session flow stores questions as [id, text, type, options] rows and answers
+# as [question_id, answer] pairs. Dict rows from older flows are still accepted.
 
-def current_question(questions: list[QuestionItem], current_index: int) -> QuestionItem | None:
+
+def load_question(row) -> QuestionItem:
+    if isinstance(row, dict):
+        return QuestionItem.from_dict(row)
+    return QuestionItem.from_tuple(row)
+
+
+def current_question(questions: list, current_index: int) -> QuestionItem | None:
     if current_index < 0 or current_index >= len(questions):
         return None
-    return questions[current_index]
-
-
-def append_answer(
-    answers: list[AnswerItem], question: QuestionItem, answer_value: str
-) -> list[AnswerItem]:
-    updated = list(answers)
-    updated.append(
-        AnswerItem(
-            question_id=question.id,
-            question_text=question.text,
-            answer=answer_value,
+    return load_question(questions[current_index])
+
+
+def append_answer(answers: list, question: QuestionItem, answer_value: str) -> list:
+    # The question text already lives in the flow's question list; don't store it twice.
+    return [*answers, (question.id, answer_value)]
+
+
+def answers_with_text(questions: list, answers: list) -> list[AnswerItem]:
+    texts = {item.id: item.text for item in map(load_question, questions)}
+    items = []
+    for row in answers:
+        if isinstance(row, dict):
+            question_id, value = int(row.get("question_id", 0)), row.get("answer", "")
+        else:
+            question_id, value = row
+        items.append(
+            AnswerItem(question_id=question_id, question_text=texts.get(question_id, ""), answer=value)
         )
-    )
-    return updated
+    return items
 
 
 def next_index(current_index: int) -> int:
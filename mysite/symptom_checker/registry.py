@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import time
+from functools import lru_cache
+
+from symptom_checker.models import Doctor
+
+
+DOCTOR_FIELDS = ("name", "specialization", "city", "phone", "email", "latitude", "longitude")
+
+# Saves clear the registry in the process that made them; other workers pick
+# the change up when their snapshot ages out.
+REGISTRY_TTL = 5 * 60
+
+
+def doctors_by_specialization() -> dict[str, list[tuple[int, dict]]]:
+    """Doctor rows grouped by lowercased specialization, as (position, row) pairs.
+
+    Positions follow primary-key order so callers can merge several groups
+    back into the order a single query would have returned.
+    """
+    return _load_doctors(int(time.monotonic() // REGISTRY_TTL))
+
+
+@lru_cache(maxsize=1)
+def _load_doctors(_generation: int) -> dict[str, list[tuple[int, dict]]]:
+    grouped: dict[str, list[tuple[int, dict]]] = {}
+    for position, row in enumerate(Doctor.objects.order_by("id").values(*DOCTOR_FIELDS)):
+        grouped.setdefault((row["specialization"] or "").lower(), []).append((position, row))
+    return grouped
+
+
+def clear() -> None:
+    _load_doctors.cache_clear()
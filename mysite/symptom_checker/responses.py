@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+if orjson is not None:
+
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def _dumps(data) -> bytes:
+        return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+class OrjsonResponse(HttpResponse):
+    """JSON response encoded with orjson, falling back to the stdlib encoder."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=_dumps(data), **kwargs)
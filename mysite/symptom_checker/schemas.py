@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
 from typing import Any
 
 
-@dataclass
+@dataclass(slots=True)
 class IntakeData:
     age: int | None
     gender: str
@@ -12,7 +12,7 @@ class IntakeData:
     symptom: str
 
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        return {"age": self.age, "gender": self.gender, "state": self.state, "symptom": self.symptom}
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "IntakeData":
@@ -24,7 +24,7 @@ class IntakeData:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class QuestionItem:
     id: int
     text: str
@@ -32,7 +32,7 @@ class QuestionItem:
     options: list[str] = field(default_factory=list)
 
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        return {"id": self.id, "text": self.text, "type": self.type, "options": list(self.options)}
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "QuestionItem":
@@ -43,15 +43,28 @@ class QuestionItem:
             options=list(data.get("options", [])),
         )
 
+    def to_tuple(self) -> tuple[int, str, str, list[str]]:
+        return (self.id, self.text, self.type, list(self.options))
 
-@dataclass
+    @classmethod
+    def from_tuple(cls, row) -> "QuestionItem":
+        # Rows come back from the session as lists; fields are already validated.
+        question_id, text, question_type, options = row
+        return cls(id=question_id, text=text, type=question_type, options=list(options))
+
+
+@dataclass(slots=True)
 class AnswerItem:
     question_id: int
     question_text: str
     answer: str
 
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        return {
+            "question_id": self.question_id,
+            "question_text": self.question_text,
+            "answer": self.answer,
+        }
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "AnswerItem":
@@ -62,7 +75,7 @@ class AnswerItem:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class DiagnosisCondition:
     name: str
     likelihood: str = ""
@@ -70,7 +83,12 @@ class DiagnosisCondition:
     specialization: str = ""
 
     def to_dict(self) -> dict[str, Any]:
-        return asdict(self)
+        return {
+            "name": self.name,
+            "likelihood": self.likelihood,
+            "reasoning": self.reasoning,
+            "specialization": self.specialization,
+        }
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "DiagnosisCondition":
@@ -82,11 +100,14 @@ class DiagnosisCondition:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class DiagnosisResult:
     conditions: list[DiagnosisCondition]
     urgency: str
     advice: str
+    # Scored locally from the questions call's plan, without a diagnosis call.
+    # Not serialized; the flow records it in its ai_calls count.
+    from_plan: bool = False
 
     def to_dict(self) -> dict[str, Any]:
         return {
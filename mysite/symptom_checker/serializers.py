@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from django.core.signing import JSONSerializer
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+
+class SessionSerializer(JSONSerializer):
+    """Session serializer that encodes the symptom flow with orjson when it's installed.
+
+    Sessions written by Django's own ``JSONSerializer`` keep loading. The
+    output is UTF-8 rather than ASCII-escaped, so switching back to the stock
+    serializer drops sessions that hold non-ASCII text.
+    """
+
+    if orjson is not None:
+
+        def dumps(self, obj):
+            # json.dumps turns non-str keys into strings; orjson only does so when asked.
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+        def loads(self, data):
+            return orjson.loads(data)
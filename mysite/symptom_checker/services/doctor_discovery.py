@@ -1,11 +1,41 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import cos, radians, sqrt
 from urllib import error as urlerror
 from urllib import parse as urlparse
 from urllib import request as urlrequest
 
 from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import requests
+except ModuleNotFoundError:
+    requests = None
+
+GEOCODE_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+SUGGEST_CACHE_TIMEOUT = 24 * 60 * 60
+
+RETRY_STATUSES = {502, 503, 504}
+RETRY_BACKOFF = 0.3
+DISCOVERY_WORKERS = 6
+
+# With requests installed, every provider call shares one keep-alive pool.
+# Built on first use by _http_session().
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Independent provider requests are issued side by side on this pool.
+_EXECUTOR = ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS, thread_name_prefix="doctor-discovery")
+
+
+def _cache_key(prefix: str, value: str) -> str:
+    return f"{prefix}:" + hashlib.sha256(value.lower().encode("utf-8")).hexdigest()
 
 
 def discover_nearby_doctors(
@@ -16,14 +46,50 @@ def discover_nearby_doctors(
         return _discover_osm(location=location, specialization=specialization, limit=limit)
     if provider == "tomtom":
         return _discover_tomtom(location=location, specialization=specialization, limit=limit)
+    if provider == "all":
+        return _discover_all(location=location, specialization=specialization, limit=limit)
     return _discover_here(location=location, specialization=specialization, limit=limit)
 
 
+def _discover_all(*, location: str, specialization: str, limit: int) -> list[dict]:
+    # Providers are independent, so the wait is the slowest one rather than the sum.
+    futures = [
+        _EXECUTOR.submit(fn, location=location, specialization=specialization, limit=limit)
+        for fn in (_discover_osm, _discover_here, _discover_tomtom)
+    ]
+    keyword = (specialization or "doctor").strip().lower()
+    ranked: list[tuple[int, float, dict]] = []
+    seen: set[str] = set()
+    for future in futures:
+        for row in future.result():
+            key = f"{(row.get('name') or '').lower()}|{(row.get('city') or '').lower()}"
+            if key in seen:
+                continue
+            seen.add(key)
+            text_blob = f"{row.get('name', '')} {row.get('specialization', '')}".lower()
+            specialization_match = 1 if keyword in text_blob else 0
+            ranked.append((specialization_match, row.get("distance_km", 9999.0), row))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return [item[2] for item in ranked[:limit]]
+
+
 def suggest_locations(query: str, *, limit: int = 6) -> list[str]:
     cleaned = (query or "").strip()
     if len(cleaned) < 2:
         return []
     max_items = max(4, min(limit, 20))
+    cache_key = _cache_key(f"geo-suggest:{max_items}", cleaned)
+    cached = cache.get(cache_key)
+    if cached:
+        return cached
+    suggestions = _suggest_locations(cleaned, max_items)
+    # Nominatim returns nothing on errors too, so only keep real hits.
+    if suggestions:
+        cache.set(cache_key, suggestions, SUGGEST_CACHE_TIMEOUT)
+    return suggestions
+
+
+def _suggest_locations(cleaned: str, max_items: int) -> list[str]:
     queries = [
         {"q": cleaned, "countrycodes": "in"},
         {"q": f"{cleaned}, India", "countrycodes": "in"},
@@ -31,14 +97,12 @@ def suggest_locations(query: str, *, limit: int = 6) -> list[str]:
     ]
     suggestions: list[str] = []
     seen: set[str] = set()
+    # One request at a time, stopping once the list is full: Nominatim's usage
+    # policy asks for no more than one request per second, so never burst it.
     for query_params in queries:
-        params = {
-            **query_params,
-            "format": "jsonv2",
-            "addressdetails": 1,
-            "limit": max_items,
-        }
-        url = "https://nominatim.openstreetmap.org/search?" + urlparse.urlencode(params)
+        url = "https://nominatim.openstreetmap.org/search?" + urlparse.urlencode(
+            {**query_params, "format": "jsonv2", "addressdetails": 1, "limit": max_items}
+        )
         payload = _fetch_json(url)
         if not isinstance(payload, list):
             continue
@@ -64,14 +128,13 @@ def _discover_osm(*, location: str, specialization: str, limit: int) -> list[dic
     lat, lon = center
     radius_m = max(1000, min(int(getattr(settings, "OSM_SEARCH_RADIUS_METERS", 12000)), 50000))
     keyword = (specialization or "doctor").strip().lower()
+    # Each statement pairs a tag filter with the around filter, so Overpass can
+    # start from the tag index instead of loading every node in the radius.
     overpass_query = f"""
 [out:json][timeout:20];
 (
-  node(around:{radius_m},{lat},{lon})["amenity"="doctors"];
-  node(around:{radius_m},{lat},{lon})["healthcare"="doctor"];
-  node(around:{radius_m},{lat},{lon})["amenity"="clinic"];
-  node(around:{radius_m},{lat},{lon})["healthcare"="clinic"];
-  node(around:{radius_m},{lat},{lon})["healthcare"="hospital"];
+  node["amenity"~"^(doctors|clinic)$"](around:{radius_m},{lat},{lon});
+  node["healthcare"~"^(doctor|clinic|hospital)$"](around:{radius_m},{lat},{lon});
 );
 out body {max(30, min(limit * 8, 100))};
 """
@@ -79,8 +142,8 @@ out body {max(30, min(limit * 8, 100))};
     elements = payload.get("elements") or []
     doctors: list[tuple[int, float, dict]] = []
     seen: set[str] = set()
-    lat_c, lon_c = lat, lon
-    for el in elements:
+    distances = _distances_km(lat, lon, elements)
+    for el, distance_km in zip(elements, distances):
         tags = el.get("tags") or {}
         name = (tags.get("name") or "").strip() or "Nearby Clinic"
         city = (
@@ -105,7 +168,6 @@ out body {max(30, min(limit * 8, 100))};
         seen.add(key)
         el_lat = el.get("lat")
         el_lon = el.get("lon")
-        distance_km = _distance_km(lat_c, lon_c, el_lat, el_lon)
         doctors.append(
             (
                 specialization_match,
@@ -206,21 +268,62 @@ def _discover_tomtom(*, location: str, specialization: str, limit: int) -> list[
 
 
 def _fetch_json(url: str) -> dict:
-    req = urlrequest.Request(
-        url,
-        headers={
-            "Accept": "application/json",
-            "User-Agent": _user_agent(),
-        },
-        method="GET",
-    )
+    headers = {
+        "Accept": "application/json",
+        "User-Agent": _user_agent(),
+    }
+    return _request_json("GET", url, headers=headers, timeout=20)
+
+
+def _http_session():
+    """The shared requests.Session, or None when requests isn't installed."""
+    global _SESSION
+    if requests is None:
+        return None
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                # One pooled connection per host for each discovery worker.
+                session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=DISCOVERY_WORKERS))
+                _SESSION = session
+    return _SESSION
+
+
+def _send(
+    method: str, url: str, *, headers: dict, body: bytes | None, timeout: float
+) -> tuple[int, bytes]:
+    session = _http_session()
+    if session is not None:
+        resp = session.request(method, url, data=body, headers=headers, timeout=timeout)
+        return resp.status_code, resp.content
+    # Without requests every call opens its own connection through urllib.
+    req = urlrequest.Request(url, data=body, headers=headers, method=method)
     try:
-        with urlrequest.urlopen(req, timeout=20) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except urlerror.HTTPError:
-        return {}
-    except Exception:
-        return {}
+        with urlrequest.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urlerror.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def _request_json(
+    method: str, url: str, *, headers: dict, body: bytes | None = None, timeout: float
+) -> dict:
+    for attempt in range(3):
+        try:
+            status, raw = _send(method, url, headers=headers, body=body, timeout=timeout)
+        except Exception:
+            return {}
+        if status in RETRY_STATUSES and attempt < 2:
+            time.sleep(RETRY_BACKOFF * 2**attempt)
+            continue
+        if status >= 400:
+            return {}
+        try:
+            return json.loads(raw)
+        except Exception:
+            return {}
+    return {}
 
 
 def _map_search_link(name: str, location: str) -> str:
@@ -238,6 +341,10 @@ def _osm_map_link(lat: float | None, lon: float | None, name: str, city: str) ->
 def _nominatim_geocode(location: str) -> tuple[float, float] | None:
     if not location:
         return None
+    cache_key = _cache_key("geo", location.strip())
+    cached = cache.get(cache_key)
+    if cached:
+        return tuple(cached)
     params = {
         "q": f"{location}, India",
         "format": "jsonv2",
@@ -248,29 +355,22 @@ def _nominatim_geocode(location: str) -> tuple[float, float] | None:
     if not isinstance(payload, list) or not payload:
         return None
     try:
-        return float(payload[0]["lat"]), float(payload[0]["lon"])
+        center = float(payload[0]["lat"]), float(payload[0]["lon"])
     except Exception:
         return None
+    cache.set(cache_key, center, GEOCODE_CACHE_TIMEOUT)
+    return center
 
 
 def _fetch_overpass(query: str) -> dict:
     endpoint = "https://overpass-api.de/api/interpreter"
     data = urlparse.urlencode({"data": query}).encode("utf-8")
-    req = urlrequest.Request(
-        endpoint,
-        data=data,
-        headers={
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Accept": "application/json",
-            "User-Agent": _user_agent(),
-        },
-        method="POST",
-    )
-    try:
-        with urlrequest.urlopen(req, timeout=25) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except Exception:
-        return {}
+    headers = {
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "Accept": "application/json",
+        "User-Agent": _user_agent(),
+    }
+    return _request_json("POST", endpoint, headers=headers, body=data, timeout=25)
 
 
 def _user_agent() -> str:
@@ -291,12 +391,18 @@ def _first_phone(item: dict) -> str | None:
     return None
 
 
-def _distance_km(lat1: float, lon1: float, lat2: float | None, lon2: float | None) -> float:
-    if lat2 is None or lon2 is None:
-        return 9999.0
+def _distances_km(lat: float, lon: float, elements: list[dict]) -> list[float]:
     # Lightweight equirectangular approximation is enough for ranking nearby POIs.
-    from math import cos, radians, sqrt
-
-    x = radians(lon2 - lon1) * cos(radians((lat1 + lat2) / 2.0))
-    y = radians(lat2 - lat1)
-    return 6371.0 * sqrt(x * x + y * y)
+    # The centre is converted once; elements without coordinates sort last.
+    lat_r, lon_r = radians(lat), radians(lon)
+    distances = []
+    for el in elements:
+        el_lat, el_lon = el.get("lat"), el.get("lon")
+        if el_lat is None or el_lon is None:
+            distances.append(9999.0)
+            continue
+        el_lat_r = radians(el_lat)
+        x = (radians(el_lon) - lon_r) * cos((lat_r + el_lat_r) / 2.0)
+        y = el_lat_r - lat_r
+        distances.append(6371.0 * sqrt(x * x + y * y))
+    return distances
@@ -1,19 +1,40 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 import re
 
-from django.db.models import Q
+from django.db.models import BooleanField, ExpressionWrapper, F, Q, Window
+from django.db.models.functions import RowNumber
 
 from articles.models import Article
 
 
+ARTICLES_PER_CONDITION = 3
+
+_TOKEN_RE = re.compile(r"[^a-zA-Z0-9]+")
+
+
 @dataclass
 class _Collectible:
     tag_code: str
     display_label: str
 
 
+@lru_cache(maxsize=512)
+def _condition_tokens(condition: str) -> tuple[str, ...]:
+    # Diagnoses repeat a small set of condition names, so the split is memoized.
+    condition_words = [w for w in _TOKEN_RE.split(condition) if len(w) > 2]
+    return tuple(token.lower() for token in condition_words[:4])
+
+
+def _token_query(tokens: tuple[str, ...]) -> Q:
+    token_query = Q()
+    for token in tokens:
+        token_query |= Q(title__icontains=token) | Q(content__icontains=token)
+    return token_query
+
+
 def recommended_articles(_conditions: list) -> list[dict]:
     condition_names: list[str] = []
     for row in _conditions or []:
@@ -24,21 +45,50 @@ def recommended_articles(_conditions: list) -> list[dict]:
         if name:
             condition_names.append(name)
 
-    queryset = Article.objects.filter(status="approved").order_by("-created_at")
     if not condition_names:
         return []
 
+    condition_tokens = [tokens for tokens in map(_condition_tokens, condition_names) if tokens]
+    if not condition_tokens:
+        return []
+
+    # One query for every condition. Each condition ranks the rows by recency
+    # within its own matches, so it still gets its three newest articles however
+    # many rows another condition matches; the rows are then credited in Python,
+    # as the per-condition queries did.
+    token_queries = [_token_query(tokens) for tokens in condition_tokens]
+    newest_first = [F("created_at").desc(), F("id").desc()]
+    ranks = {
+        f"rank_{i}": Window(
+            RowNumber(),
+            partition_by=[ExpressionWrapper(token_query, output_field=BooleanField())],
+            order_by=newest_first,
+        )
+        for i, token_query in enumerate(token_queries)
+    }
+    within_limit = Q()
+    for name in ranks:
+        within_limit |= Q(**{f"{name}__lte": ARTICLES_PER_CONDITION})
+    candidates = list(
+        Article.objects.filter(status="approved")
+        .filter(Q.create(token_queries, connector=Q.OR))
+        .annotate(**ranks)
+        .filter(within_limit)
+        .order_by(*newest_first)
+        .only("id", "title", "content", "category")
+    )
+    haystacks = [f"{article.title}\n{article.content}".lower() for article in candidates]
+
     matched: list[dict] = []
     seen_ids: set[int] = set()
-    for condition in condition_names:
-        condition_words = [w for w in re.split(r"[^a-zA-Z0-9]+", condition) if len(w) > 2]
-        if not condition_words:
-            continue
-        token_query = Q()
-        for token in condition_words[:4]:
-            token_query |= Q(title__icontains=token) | Q(content__icontains=token)
-        scoped = queryset.filter(token_query)
-        for article in scoped[:3]:
+    for tokens in condition_tokens:
+        per_condition = 0
+        for article, haystack in zip(candidates, haystacks):
+            if per_condition >= ARTICLES_PER_CONDITION:
+                break
+            if not any(token in haystack for token in tokens):
+                continue
+            per_condition += 1
             if article.id in seen_ids:
                 continue
             seen_ids.add(article.id)
@@ -1,28 +1,80 @@
+import json
+from concurrent.futures import Future
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache, caches
+from django.core.signing import JSONSerializer
+from django.test import RequestFactory, TestCase
 
+from articles.models import Article
+from symptom_checker import ai_client, engine, registry
 from symptom_checker.ai_client import AIGenerationError
-from symptom_checker.models import BodyArea, Condition, ConditionArticle, Doctor, Symptom
-from symptom_checker.schemas import DiagnosisCondition, DiagnosisResult, QuestionItem
+from symptom_checker.models import BodyArea, Doctor, Symptom
+from symptom_checker.question_flow import answers_with_text, current_question
+from symptom_checker.schemas import (
+    AnswerItem,
+    DiagnosisCondition,
+    DiagnosisResult,
+    IntakeData,
+    QuestionItem,
+)
+from symptom_checker.serializers import SessionSerializer
+from symptom_checker.services import doctor_discovery
+
+INTAKE = {"age": 21, "gender": "Male", "state": "Kerala", "symptom": "nose bleeding"}
+
+QUESTIONS = [
+    QuestionItem(id=1, text="Any injury?", type="yesno", options=[]),
+    QuestionItem(id=2, text="Is it recurring?", type="yesno", options=[]),
+]
+
+PLAN = {
+    "conditions": [
+        {
+            "name": "Nose Trauma",
+            "reasoning": "Bleeding after an injury.",
+            "specialization": "ENT",
+            "urgency": "Moderate",
+            "yes_signals": [1],
+        }
+    ],
+    "advice": "Use local compression and consult ENT if recurring.",
+}
+
+DIAGNOSIS = DiagnosisResult(
+    conditions=[
+        DiagnosisCondition(
+            name="Nose Trauma",
+            likelihood="Medium",
+            reasoning="Answer pattern suggests local irritation.",
+            specialization="ENT",
+        )
+    ],
+    urgency="Moderate",
+    advice="Use local compression and consult ENT if recurring.",
+)
 
 
 class ProfessionalFlowTests(TestCase):
     def setUp(self):
+        cache.clear()
+        # Keep the result page off the network: no external doctor lookups.
+        discovery = patch("symptom_checker.engine.discover_nearby_doctors", return_value=[])
+        discovery.start()
+        self.addCleanup(discovery.stop)
+
         area = BodyArea.objects.create(name="General")
         Symptom.objects.create(name="Nose bleeding", body_area=area)
-        self.condition = Condition.objects.create(
-            name="Nose Trauma",
-            description="Minor trauma and irritation can cause intermittent nose bleeds.",
-            urgency_level=Condition.URGENCY_CLINIC,
-            specialization="ENT",
-        )
-        ConditionArticle.objects.create(
-            condition=self.condition,
+        author = get_user_model().objects.create_user(username="writer", password="unused-pass")
+        Article.objects.create(
             title="Managing Nose Bleeds Safely",
-            summary="First-aid steps and red-flag indicators.",
-            url="https://example.com/nosebleed",
-            active=True,
+            content="First-aid steps and red-flag indicators after minor nose trauma.",
+            author=author,
+            status="approved",
         )
         Doctor.objects.create(
             name="Dr. Asha Menon",
@@ -111,3 +163,337 @@ class ProfessionalFlowTests(TestCase):
         # Reopening result should not trigger another AI diagnosis call.
         self.client.get("/symptoms/result/")
         self.assertEqual(mock_generate_diagnosis.call_count, 1)
+
+
+@patch("symptom_checker.engine.discover_nearby_doctors", return_value=[])
+class ResultPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Doctor.objects.create(
+            name="Dr. Asha Menon",
+            specialization="ENT",
+            city="Kochi",
+            phone="9999999999",
+            email="asha@example.com",
+        )
+
+    def _answer_all(self, *answers):
+        self.client.post("/symptoms/question/", data=INTAKE)
+        for answer in answers:
+            self.client.post("/symptoms/question/", data={"answer": answer})
+
+    @patch("symptom_checker.engine.generate_diagnosis")
+    @patch("symptom_checker.engine.cached_plan", return_value=PLAN)
+    @patch("symptom_checker.engine.generate_questions", return_value=QUESTIONS)
+    def test_plan_scores_diagnosis_without_gemini_call(
+        self, _questions, _plan, mock_generate_diagnosis, _discover
+    ):
+        self._answer_all("yes", "no")
+        response = self.client.get("/symptoms/result/")
+
+        self.assertContains(response, "Nose Trauma")
+        self.assertContains(response, "Questions=1, Diagnosis=0")
+        mock_generate_diagnosis.assert_not_called()
+        self.assertEqual(self.client.session["symptom_checker_flow"]["ai_calls"]["diagnosis"], 0)
+
+    @patch("symptom_checker.engine.generate_diagnosis", return_value=DIAGNOSIS)
+    @patch("symptom_checker.engine.cached_plan", return_value=PLAN)
+    @patch("symptom_checker.engine.generate_questions", return_value=QUESTIONS)
+    def test_text_answer_falls_back_to_gemini_diagnosis(
+        self, _questions, _plan, mock_generate_diagnosis, _discover
+    ):
+        self._answer_all("yes", "only when I sneeze")
+        response = self.client.get("/symptoms/result/")
+
+        self.assertContains(response, "Questions=1, Diagnosis=1")
+        self.assertEqual(mock_generate_diagnosis.call_count, 1)
+
+    @patch("symptom_checker.engine.generate_diagnosis", return_value=DIAGNOSIS)
+    @patch("symptom_checker.engine.cached_plan", return_value=None)
+    @patch("symptom_checker.engine.generate_questions", return_value=QUESTIONS)
+    def test_settled_result_is_tagged_and_revalidated(
+        self, _questions, _plan, mock_generate_diagnosis, _discover
+    ):
+        self._answer_all("yes", "no")
+        first = self.client.get("/symptoms/result/")
+
+        # Later loads are served from the rendered-page cache and carry an ETag.
+        with patch("symptom_checker.views.get_or_build_result") as mock_build:
+            cached = self.client.get("/symptoms/result/")
+        mock_build.assert_not_called()
+        self.assertEqual(cached.content, first.content)
+
+        not_modified = self.client.get(
+            "/symptoms/result/", headers={"If-None-Match": cached.headers["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(mock_generate_diagnosis.call_count, 1)
+
+    @patch("symptom_checker.engine.generate_questions", return_value=QUESTIONS)
+    def test_locked_flow_returns_conflict_instead_of_running_unlocked(self, _questions, _discover):
+        self.client.post("/symptoms/question/", data=INTAKE)
+        lock_key = f"symptom_checker:lock:{self.client.session.session_key}"
+        caches[engine.FLOW_LOCK_CACHE].add(lock_key, 1, 60)
+
+        with patch("symptom_checker.engine.FLOW_LOCK_WAIT", 0.1):
+            response = self.client.post("/symptoms/question/", data={"answer": "yes"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.session["symptom_checker_flow"]["current_index"], 0)
+
+
+class FlowLockTests(TestCase):
+    def setUp(self):
+        self.locks = caches[engine.FLOW_LOCK_CACHE]
+        self.locks.clear()
+        self.session = SessionStore()
+        self.session.create()
+        self.request = RequestFactory().post("/symptoms/question/")
+        self.request.session = self.session
+        self.lock_key = f"symptom_checker:lock:{self.session.session_key}"
+
+    def test_saves_inside_the_lock_and_releases_it(self):
+        with engine.flow_lock(self.request):
+            self.assertTrue(self.locks.get(self.lock_key))
+            self.session["symptom_checker_flow"] = {"current_index": 3}
+
+        # Still modified, so SessionMiddleware refreshes the cookie and expiry.
+        self.assertTrue(self.session.modified)
+        self.assertIsNone(self.locks.get(self.lock_key))
+        stored = SessionStore(session_key=self.session.session_key)
+        self.assertEqual(stored["symptom_checker_flow"], {"current_index": 3})
+
+    def test_async_lock_saves_inside_the_lock_and_releases_it(self):
+        async def answer():
+            async with engine.aflow_lock(self.request):
+                self.assertTrue(await self.locks.aget(self.lock_key))
+                self.session["symptom_checker_flow"] = {"current_index": 4}
+
+        async_to_sync(answer)()
+        self.assertIsNone(self.locks.get(self.lock_key))
+        stored = SessionStore(session_key=self.session.session_key)
+        self.assertEqual(stored["symptom_checker_flow"], {"current_index": 4})
+
+    def test_busy_lock_raises(self):
+        self.locks.add(self.lock_key, 1, 60)
+        with patch("symptom_checker.engine.FLOW_LOCK_WAIT", 0.1):
+            with self.assertRaises(engine.FlowBusyError):
+                with engine.flow_lock(self.request):
+                    pass
+        self.assertTrue(self.locks.get(self.lock_key))
+
+    def test_timeout_covers_the_gemini_retry_budget(self):
+        self.assertGreater(engine.FLOW_LOCK_TIMEOUT, ai_client.GEMINI_CALL_BUDGET)
+
+
+class AIClientTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.intake = IntakeData(age=29, gender="Male", state="Kerala", symptom="cough")
+        self.valid_reply = json.dumps(
+            {
+                "questions": [
+                    {"id": i, "text": f"Question {i}?", "type": "yesno", "ai_generated": True}
+                    for i in range(1, 16)
+                ],
+                "plan": None,
+            }
+        )
+
+    @patch(
+        "symptom_checker.ai_client._read_config",
+        side_effect=lambda name, default="": default or "key",
+    )
+    def test_malformed_reply_is_not_cached(self, _config):
+        replies = ["not json", self.valid_reply]
+        with patch("symptom_checker.ai_client._call_gemini", side_effect=replies) as mock_call:
+            with self.assertRaises(AIGenerationError):
+                ai_client.generate_questions(self.intake)
+            self.assertEqual(len(ai_client.generate_questions(self.intake)), 15)
+            self.assertEqual(len(ai_client.generate_questions(self.intake)), 15)
+        self.assertEqual(mock_call.call_count, 2)
+
+    @patch("symptom_checker.ai_client.GEMINI_CALL_BUDGET", 0.01)
+    @patch(
+        "symptom_checker.ai_client._read_config",
+        side_effect=lambda name, default="": default or "key",
+    )
+    def test_follower_calls_directly_when_leader_stalls(self, _config):
+        key = ai_client._prompt_cache_key("response", "gemini-2.5-flash\0ping")
+        ai_client._INFLIGHT[key] = Future()
+        try:
+            with patch("symptom_checker.ai_client._call_gemini", return_value="pong") as mock_call:
+                result = ai_client._generate_content_with_retry("ping", str.upper)
+        finally:
+            ai_client._INFLIGHT.pop(key, None)
+        self.assertEqual(result, "PONG")
+        mock_call.assert_called_once()
+        self.assertEqual(cache.get(key), "pong")
+
+    def test_httpx_pool_is_built_once_and_reads_retry_after(self):
+        created = []
+
+        class FakeClient:
+            def __init__(self, **kwargs):
+                created.append(kwargs)
+
+            def post(self, path, *, content, headers):
+                return SimpleNamespace(
+                    status_code=429,
+                    headers=fake_httpx.Headers({"Retry-After": "3"}),
+                    content=b"slow down",
+                )
+
+        fake_httpx = SimpleNamespace(Client=FakeClient, Limits=dict, Headers=dict)
+        with patch.object(ai_client, "httpx", fake_httpx), patch.object(ai_client, "_HTTPX_CLIENT", None):
+            for _ in range(2):
+                with self.assertRaises(ai_client._RetryableError) as ctx:
+                    ai_client._call_gemini(prompt="ping", api_key="key", model="gemini-2.5-flash")
+                self.assertEqual(ctx.exception.retry_after, 3.0)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0]["base_url"], f"https://{ai_client.GEMINI_HOST}")
+
+    def test_cohort_shares_prompt_and_cache_key(self):
+        older = IntakeData(age=21, gender="Male", state="Kerala", symptom="cough")
+        self.assertEqual(
+            ai_client._questions_cache_key(self.intake), ai_client._questions_cache_key(older)
+        )
+        self.assertEqual(
+            ai_client._questions_prompt(self.intake), ai_client._questions_prompt(older)
+        )
+        self.assertIn("Age: 20-29", ai_client._questions_prompt(self.intake))
+
+    def test_diagnosis_from_plan_reports_its_source(self):
+        answers = [
+            AnswerItem(question_id=1, question_text="Any injury?", answer="yes"),
+            AnswerItem(question_id=2, question_text="Is it recurring?", answer="no"),
+        ]
+        diagnosis = ai_client.diagnosis_from_plan(PLAN, QUESTIONS, answers)
+        self.assertTrue(diagnosis.from_plan)
+        self.assertEqual(diagnosis.conditions[0].name, "Nose Trauma")
+        self.assertEqual(diagnosis.conditions[0].likelihood, "High")
+
+        answers[1].answer = "sometimes"
+        self.assertIsNone(ai_client.diagnosis_from_plan(PLAN, QUESTIONS, answers))
+
+    @patch("symptom_checker.ai_client._call_gemini")
+    def test_plan_cached_with_questions_skips_diagnosis_call(self, mock_call):
+        cache.set(
+            ai_client._questions_cache_key(self.intake),
+            {"questions": [question.to_dict() for question in QUESTIONS], "plan": PLAN},
+        )
+        answers = [
+            AnswerItem(question_id=1, question_text="Any injury?", answer="yes"),
+            AnswerItem(question_id=2, question_text="Is it recurring?", answer="no"),
+        ]
+        diagnosis = ai_client.generate_diagnosis(self.intake, answers)
+        self.assertTrue(diagnosis.from_plan)
+        mock_call.assert_not_called()
+
+
+class DoctorRegistryTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.doctor = Doctor.objects.create(
+            name="Dr. Asha Menon",
+            specialization="ENT",
+            city="Kochi",
+            phone="9999999999",
+            email="asha@example.com",
+        )
+
+    def test_groups_doctors_by_lowercased_specialization(self):
+        groups = registry.doctors_by_specialization()
+        self.assertEqual([row["name"] for _, row in groups["ent"]], ["Dr. Asha Menon"])
+
+    def test_saves_and_deletes_refresh_the_registry(self):
+        registry.doctors_by_specialization()
+        Doctor.objects.create(
+            name="Dr. Ravi Nair",
+            specialization="Cardiologist",
+            city="Kochi",
+            phone="8888888888",
+            email="ravi@example.com",
+        )
+        self.assertIn("cardiologist", registry.doctors_by_specialization())
+
+        self.doctor.delete()
+        self.assertNotIn("ent", registry.doctors_by_specialization())
+
+
+class DoctorDiscoveryHTTPTests(TestCase):
+    @patch("symptom_checker.services.doctor_discovery.time.sleep")
+    def test_requests_session_is_shared_and_retries_gateway_errors(self, _sleep):
+        sessions = []
+        replies = [
+            SimpleNamespace(status_code=503, content=b""),
+            SimpleNamespace(status_code=200, content=b'{"ok": 1}'),
+        ]
+
+        class FakeSession:
+            def __init__(self):
+                sessions.append(self)
+                self.calls = []
+
+            def mount(self, prefix, adapter):
+                pass
+
+            def request(self, method, url, **kwargs):
+                self.calls.append((method, url))
+                return replies.pop(0) if replies else SimpleNamespace(status_code=200, content=b"[]")
+
+        fake_requests = SimpleNamespace(
+            Session=FakeSession, adapters=SimpleNamespace(HTTPAdapter=lambda **kwargs: None)
+        )
+        with patch.object(doctor_discovery, "requests", fake_requests), patch.object(
+            doctor_discovery, "_SESSION", None
+        ):
+            self.assertEqual(doctor_discovery._fetch_json("https://example.com/a"), {"ok": 1})
+            self.assertEqual(doctor_discovery._fetch_json("https://example.com/b"), [])
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(
+            sessions[0].calls,
+            [("GET", "https://example.com/a")] * 2 + [("GET", "https://example.com/b")],
+        )
+
+
+class SessionRowTests(TestCase):
+    def test_tuple_and_legacy_dict_rows_load_alike(self):
+        rows = [
+            (1, "Any injury?", "yesno", []),
+            {"id": 2, "text": "Which side?", "type": "single_choice", "options": ["Left", "Right"]},
+        ]
+        self.assertEqual(current_question(rows, 0), QUESTIONS[0])
+        self.assertEqual(current_question(rows, 1).options, ["Left", "Right"])
+        self.assertIsNone(current_question(rows, 2))
+
+        answers = answers_with_text(rows, [(1, "yes"), {"question_id": 2, "answer": "Left"}])
+        self.assertEqual(
+            answers,
+            [
+                AnswerItem(question_id=1, question_text="Any injury?", answer="yes"),
+                AnswerItem(question_id=2, question_text="Which side?", answer="Left"),
+            ],
+        )
+
+
+class SessionSerializerTests(TestCase):
+    def test_round_trips_the_flow(self):
+        flow = {
+            "symptom_checker_flow": {
+                "questions": [[1, "Fièvre ?", "yesno", []]],
+                "answers": [[1, "yes"]],
+            }
+        }
+        self.assertEqual(SessionSerializer().loads(SessionSerializer().dumps(flow)), flow)
+
+    def test_int_keys_become_strings_like_the_django_serializer(self):
+        data = {"scores": {1: 0.5, 2: 0.25}}
+        self.assertEqual(
+            SessionSerializer().loads(SessionSerializer().dumps(data)),
+            JSONSerializer().loads(JSONSerializer().dumps(data)),
+        )
+
+    def test_loads_sessions_written_by_django_serializer(self):
+        data = {"symptom_checker_flow": {"current_index": 2, "intake": {"symptom": "Fièvre"}}}
+        self.assertEqual(SessionSerializer().loads(JSONSerializer().dumps(data)), data)
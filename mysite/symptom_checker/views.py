@@ -1,76 +1,130 @@
 from __future__ import annotations
 
-from django.http import JsonResponse
-from django.shortcuts import redirect, render
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
 from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from symptom_checker.ai_client import AIGenerationError
 from symptom_checker.engine import (
+    RESULT_PAGE_CACHE_TIMEOUT,
+    FlowBusyError,
+    aflow_lock,
+    astart_session,
+    diagnosis_hash,
     get_or_build_result,
     has_active_session,
     question_context,
     reset_session,
-    start_session,
+    result_page_cache_key,
     submit_answer,
 )
+from symptom_checker.responses import OrjsonResponse
 from symptom_checker.schemas import IntakeData
 from symptom_checker.services.doctor_discovery import suggest_locations
 
+INTAKE_FIELDS = ("symptom", "gender", "state", "age")
+
+
+@lru_cache(maxsize=None)
+def _url(name: str) -> str:
+    # URLconf can't be reversed at import (it imports this module), so each
+    # name is resolved on first use and reused after that.
+    return reverse(name)
+
+
+def _redirect(name: str) -> HttpResponseRedirect:
+    return HttpResponseRedirect(_url(name))
+
+
+def _busy_response() -> HttpResponse:
+    # Another tab holds the flow; let the browser retry rather than act unlocked.
+    return HttpResponse(
+        "This symptom check is busy in another tab. Please retry in a few seconds.",
+        status=409,
+        headers={"Retry-After": "5"},
+    )
+
 
 def start(request):
     if request.method == "POST":
-        return redirect("question")
+        return _redirect("question")
     return render(request, "symptom_checker/start.html")
 
 
-def question(request):
+async def question(request):
     if request.method == "POST" and "symptom" in request.POST:
-        symptom = (request.POST.get("symptom") or "").strip()
-        gender = (request.POST.get("gender") or "").strip()
-        state = (request.POST.get("state") or "").strip()
-        age_raw = (request.POST.get("age") or "").strip()
-        form_data = {"symptom": symptom, "gender": gender or "Male", "state": state, "age": age_raw}
-        if not symptom:
-            return render(
-                request,
-                "symptom_checker/start.html",
-                {"error_message": "Please enter your main symptom.", "form_data": form_data},
-            )
-
-        try:
-            age = int(age_raw) if age_raw else None
-        except ValueError:
-            return render(
-                request,
-                "symptom_checker/start.html",
-                {"error_message": "Age must be a number.", "form_data": form_data},
-            )
-
-        intake = IntakeData(age=age, gender=gender, state=state, symptom=symptom)
+        return await _start_flow(request)
+    if request.method == "POST":
+        # Double-submitted answers must not both advance the flow.
         try:
-            start_session(request, intake)
-        except AIGenerationError as exc:
-            return render(
-                request,
-                "symptom_checker/start.html",
-                {"error_message": f"Live AI question generation failed: {exc}", "form_data": form_data},
-            )
-        return redirect("question")
+            async with aflow_lock(request):
+                return await sync_to_async(_question)(request)
+        except FlowBusyError:
+            return _busy_response()
+    return await sync_to_async(_question)(request)
+
+
+def _parse_intake(post) -> tuple[IntakeData | None, dict, str]:
+    """The intake from the start form, the values to echo back, and any validation error."""
+    symptom, gender, state, age_raw = [(post.get(name) or "").strip() for name in INTAKE_FIELDS]
+    form_data = {"symptom": symptom, "gender": gender or "Male", "state": state, "age": age_raw}
+    if not symptom:
+        return None, form_data, "Please enter your main symptom."
+    try:
+        age = int(age_raw) if age_raw else None
+    except ValueError:
+        return None, form_data, "Age must be a number."
+    return IntakeData(age=age, gender=gender, state=state, symptom=symptom), form_data, ""
+
+
+async def _start_flow(request):
+    intake, form_data, error_message = _parse_intake(request.POST)
+    if intake is None:
+        return await _render_start_error(request, error_message, form_data)
+
+    # The worker is free to serve other requests while Gemini writes the questions.
+    try:
+        await astart_session(request, intake)
+    except AIGenerationError as exc:
+        return await _render_start_error(
+            request, f"Live AI question generation failed: {exc}", form_data
+        )
+    except FlowBusyError:
+        return _busy_response()
+    # Show the first question now rather than redirecting for it.
+    return await sync_to_async(_question)(request)
+
+
+@sync_to_async
+def _render_start_error(request, error_message: str, form_data: dict):
+    return render(
+        request,
+        "symptom_checker/start.html",
+        {"error_message": error_message, "form_data": form_data},
+    )
 
+
+def _question(request):
     if request.method == "POST" and "answer" in request.POST:
         if not has_active_session(request):
-            return redirect("symptom_home")
+            return _redirect("symptom_home")
         answer_value = (request.POST.get("answer") or "").strip()
         if answer_value:
             is_done = submit_answer(request, answer_value)
             if is_done:
-                return redirect("result_page")
+                return _redirect("result_page")
 
     context = question_context(request)
     if not context["has_session"]:
-        return redirect("symptom_home")
+        return _redirect("symptom_home")
     if context["completed"]:
-        return redirect("result_page")
+        return _redirect("result_page")
 
     return render(
         request,
@@ -84,17 +138,35 @@ def question(request):
     )
 
 
-def result_page(request):
-    if not has_active_session(request):
-        return redirect("symptom_home")
+@cache_control(private=True, no_cache=True)
+async def result_page(request):
+    # Held while the diagnosis is built, so a second tab waits for it instead
+    # of paying for another Gemini call.
+    try:
+        async with aflow_lock(request):
+            return await sync_to_async(_result_page)(request)
+    except FlowBusyError:
+        return _busy_response()
+
+
+# Checked under the lock: a settled diagnosis tags the page, so reloads that
+# send it back get a 304.
+@condition(etag_func=diagnosis_hash)
+def _result_page(request):
+    # A settled diagnosis always renders the same page, so reloads reuse it.
+    cache_key = result_page_cache_key(request)
+    if cache_key:
+        html = cache.get(cache_key)
+        if html is not None:
+            return HttpResponse(html)
 
     result = get_or_build_result(request)
     if not result:
-        return redirect("symptom_home")
+        return _redirect("symptom_home")
 
     diagnosis = result.get("diagnosis", {})
     conditions = diagnosis.get("conditions", [])
-    return render(
+    response = render(
         request,
         "symptom_checker/result.html",
         {
@@ -111,14 +183,18 @@ def result_page(request):
             "ai_error": result.get("ai_error", ""),
         },
     )
+    cache_key = result_page_cache_key(request)
+    if cache_key:
+        cache.set(cache_key, response.content, RESULT_PAGE_CACHE_TIMEOUT)
+    return response
 
 
 def reset_flow(request):
     reset_session(request)
-    return redirect(reverse("symptom_home"))
+    return _redirect("symptom_home")
 
 
 def location_suggest(request):
     query = (request.GET.get("q") or "").strip()
     items = suggest_locations(query, limit=15)
-    return JsonResponse({"items": items})
+    return OrjsonResponse({"items": items})